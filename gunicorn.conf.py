@@ -0,0 +1,58 @@
+"""
+Gunicorn configuration for lab_inventory (used by the Procfile).
+
+All knobs are environment-driven:
+
+    GUNICORN_WORKER_CLASS   gthread (default) | uvicorn | sync
+    WEB_CONCURRENCY         number of worker processes (default: 2 * CPUs + 1)
+    GUNICORN_THREADS        threads per gthread worker (default: 4)
+    GUNICORN_TIMEOUT        worker timeout in seconds (default: 30)
+    PORT                    bind port (default: 8000)
+
+gthread serves the WSGI app; uvicorn serves lab_inventory.asgi so async views
+run natively.
+
+Load test
+---------
+Compare the old profile (bare `gunicorn lab_inventory.wsgi`, default sync
+workers) with this one using the same token and endpoint:
+
+    # before
+    gunicorn lab_inventory.wsgi --bind 0.0.0.0:8000
+    # after
+    gunicorn -c gunicorn.conf.py
+
+    wrk -t4 -c64 -d30s -H "Authorization: Token <token>" http://127.0.0.1:8000/api/requests/
+
+Record requests/sec and p99 latency from both runs. The polling endpoints are
+I/O-bound (Postgres round trips), so threaded workers with persistent DB
+connections should sustain far more concurrent clients than 1 sync worker.
+"""
+
+import multiprocessing
+import os
+
+_worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+keepalive = 5
+
+# Recycle workers now and then so a slow leak can't grow forever
+max_requests = 1000
+max_requests_jitter = 100
+
+if _worker_class == 'uvicorn':
+    worker_class = 'uvicorn_worker.UvicornWorker'
+    wsgi_app = 'lab_inventory.asgi:application'
+else:
+    worker_class = _worker_class
+    threads = int(os.environ.get('GUNICORN_THREADS', 4))
+    wsgi_app = 'lab_inventory.wsgi:application'
+
+raw_env = [
+    f"DJANGO_SETTINGS_MODULE={os.environ.get('DJANGO_SETTINGS_MODULE', 'lab_inventory.settings_production')}",
+]
+
+accesslog = '-'
@@ -1,9 +1,14 @@
 from django.contrib import admin
-from .models import Component, Request, RequestItem
+from .models import Component, Kit, KitComponent, Request, RequestItem, StockAuditEntry, WaitlistEntry
 from django.utils import timezone
 from django.contrib import messages
-import csv
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import F
+from django.urls import reverse
+from django.utils.html import format_html
+from .audit import audit_batch, record
+from .jobs import enqueue
+from users.models import deferred_user_fields
 
 class RequestItemInline(admin.TabularInline):
     model = RequestItem
@@ -20,34 +25,39 @@ class RequestItemInline(admin.TabularInline):
 
 @admin.register(Request)
 class RequestAdmin(admin.ModelAdmin):
-    list_display = ['id', 'student', 'status', 'return_date', 'requested_at']
+    list_display = ['id', 'student', 'status', 'line_count', 'outstanding', 'return_date', 'requested_at']
     list_filter = ['status', 'requested_at']
     inlines = [RequestItemInline]
-    search_fields = ['student__username', 'student__first_name', 'student__email']
+    search_fields = ['student__username', 'student__first_name', 'student__email', 'student__roll_number']
     actions = ['export_to_csv'] # Added the action here
 
+    # The changelist prints the student via __str__: join it without the heavy columns
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_student()
+
     # --- CSV EXPORT FUNCTION ---
+    # Built by the background worker; the admin just gets a link to poll/download.
     def export_to_csv(self, request, queryset):
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="idealab_requests.csv"'
-        writer = csv.writer(response)
-        writer.writerow(['ID', 'Student', 'Status', 'Request Date', 'Return Date'])
-        for obj in queryset:
-            writer.writerow([obj.id, obj.student.username, obj.status, obj.requested_at, obj.return_date])
-        return response
-    export_to_csv.short_description = "Download selected as CSV"
+        job = enqueue('export_requests_csv', user=request.user, request_ids=list(queryset.values_list('id', flat=True)))
+        self.message_user(request, format_html(
+            'Export queued as job #{}. <a href="{}">Download</a> once it has finished.',
+            job.pk, reverse('api-job-download', args=[job.pk]),
+        ))
+    export_to_csv.short_description = "Export selected as CSV"
 
     # --- COMBINED SAVE MODEL ---
     def save_model(self, request, obj, form, change):
+        # Checked per line: an over-return on one line would hide a short one in the totals.
+        # A single query for the first short line, without loading the rest of the items.
         if obj.status == 'returned':
-            items = obj.items.all()
-            for item in items:
-                if item.returned_quantity < item.issued_quantity:
-                    obj.status = 'collected'
-                    messages.error(request, f"CANNOT RETURN: {item.component.name} is still missing {item.issued_quantity - item.returned_quantity} units!")
-                    super().save_model(request, obj, form, change)
-                    return 
+            item = obj.items.filter(returned_quantity__lt=F('issued_quantity')).select_related('component').first()
+            if item is not None:
+                obj.status = 'collected'
+                messages.error(request, f"CANNOT RETURN: {item.component.name} is still missing {item.issued_quantity - item.returned_quantity} units!")
+                super().save_model(request, obj, form, change)
+                return
 
+        if obj.status == 'returned':
             if not obj.return_date:
                 obj.return_date = timezone.now().date()
         
@@ -74,4 +84,56 @@ class RequestAdmin(admin.ModelAdmin):
         return sections
 
 # Register Component separately
-admin.site.register(Component)
\ No newline at end of file
+@admin.register(Component)
+class ComponentAdmin(admin.ModelAdmin):
+    list_display = ['name', 'code', 'category', 'total_quantity', 'available_quantity']
+    list_select_related = ['category']
+    search_fields = ['name', 'code']
+
+    # Raw stock edits still land in the audit trail
+    def save_model(self, request, obj, form, change):
+        before = form.initial.get('available_quantity', 0) if change else 0
+        with transaction.atomic(), audit_batch(request.user):
+            super().save_model(request, obj, form, change)
+            record(obj.pk, obj.available_quantity - before, 'admin_edit')
+
+
+@admin.register(StockAuditEntry)
+class StockAuditEntryAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'component', 'delta', 'reason', 'request_ref', 'user']
+    list_filter = ['reason']
+    date_hierarchy = 'created_at'
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('component', 'user').defer(
+            'component__category', 'component__total_quantity', 'component__available_quantity',
+            *deferred_user_fields('user'),
+        )
+
+    # Append-only
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+class KitComponentInline(admin.TabularInline):
+    model = KitComponent
+    extra = 1
+
+@admin.register(Kit)
+class KitAdmin(admin.ModelAdmin):
+    list_display = ['name', 'description']
+    inlines = [KitComponentInline]
+
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ['id', 'component', 'student', 'quantity', 'priority', 'status', 'requested_at']
+    list_filter = ['status']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('component', 'student').defer(
+            'component__category', 'component__total_quantity', 'component__available_quantity',
+            *deferred_user_fields('student'),
+        )
+    list_editable = ['priority']
@@ -0,0 +1,68 @@
+from django.db import transaction
+from django.db.models import Max, Value
+from django.utils.dateparse import parse_date
+
+from .models import ArchivedRequest, ArchivedRequestItem, Request, RequestItem
+
+FINISHED_STATUSES = ('returned', 'rejected')
+
+REQUEST_FIELDS = [
+    'id', 'student_id', 'status', 'approved_by_id', 'requested_at',
+    'collected_at', 'return_deadline', 'return_date', *Request.TOTAL_FIELDS,
+]
+ITEM_FIELDS = ['id', 'request_id', 'component_id', 'quantity', 'issued_quantity', 'returned_quantity', 'kit_id']
+
+
+def archive_finished_requests(before, chunk_size=500):
+    """
+    Moves finished requests made before ``before`` (and their items) to the archive tables.
+    Each chunk is copied and deleted in its own transaction. Returns the number archived.
+    """
+    candidates = Request.objects.filter(status__in=FINISHED_STATUSES, requested_at__lt=before)
+    moved = 0
+    while True:
+        with transaction.atomic():
+            ids = list(candidates.order_by('id').values_list('id', flat=True)[:chunk_size])
+            if not ids:
+                break
+            ArchivedRequest.objects.bulk_create(
+                ArchivedRequest(**row) for row in Request.objects.filter(pk__in=ids).values(*REQUEST_FIELDS)
+            )
+            ArchivedRequestItem.objects.bulk_create(
+                ArchivedRequestItem(**row) for row in RequestItem.objects.filter(request_id__in=ids).values(*ITEM_FIELDS)
+            )
+            Request.objects.filter(pk__in=ids).delete()
+        moved += len(ids)
+    return moved
+
+
+def history_needs_archive(start_date):
+    """True if a history search starting at ``start_date`` (None = all time) can reach archived rows."""
+    latest = ArchivedRequest.objects.aggregate(latest=Max('requested_at'))['latest']
+    if latest is None:
+        return False
+    start = parse_date(start_date) if start_date else None
+    return start is None or start <= latest.date()
+
+
+def combined_history(hot, cold, ordering=None):
+    """
+    Union of live and archived history keys for pagination, sorted by ``ordering`` (a
+    requested_at/outstanding field, optionally '-'-prefixed) then newest first.
+    Rows are {'id', 'requested_at', 'outstanding', 'archived'} dicts; load the page with
+    ``load_history_page``.
+    """
+    fields = ('id', 'requested_at', 'outstanding', 'archived')
+
+    def keys(queryset, archived):
+        return queryset.order_by().prefetch_related(None).annotate(archived=Value(archived)).values(*fields)
+
+    order = dict.fromkeys([ordering or '-requested_at', '-requested_at', '-id'])
+    return keys(hot, False).union(keys(cold, True), all=True).order_by(*order)
+
+
+def load_history_page(rows, hot, cold):
+    """Fetches the full objects for a page of ``combined_history`` rows, keeping their order."""
+    hot_objs = hot.in_bulk([row['id'] for row in rows if not row['archived']])
+    cold_objs = cold.in_bulk([row['id'] for row in rows if row['archived']])
+    return [(cold_objs if row['archived'] else hot_objs)[row['id']] for row in rows]
@@ -0,0 +1,94 @@
+"""
+Stock audit trail.
+
+Every code path that changes Component.available_quantity records the change
+inside an ``audit_batch()``. Entries are buffered in memory and written with a
+single bulk_create when the surrounding transaction commits, so auditing costs
+one INSERT per operation however many items it touches, and a rolled-back
+operation leaves no entries behind. Nested batches (e.g. a return that
+triggers waitlist allocation) share the outermost buffer.
+"""
+import functools
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import StockAuditEntry
+from .stock_history import record_levels
+
+_local = threading.local()
+
+
+class AuditBatch:
+    def __init__(self, user=None):
+        self.user = user if user is not None and user.is_authenticated else None
+        self.entries = []
+
+    def add(self, component_id, delta, reason, request_id=None):
+        if delta:
+            self.entries.append(StockAuditEntry(
+                component_id=component_id,
+                delta=delta,
+                reason=reason,
+                request_ref=request_id,
+                user=self.user,
+                created_at=timezone.now(),
+            ))
+
+    def flush(self):
+        if self.entries:
+            StockAuditEntry.objects.bulk_create(self.entries)
+            # Same change points feed the stock-level time series
+            record_levels({entry.component_id for entry in self.entries})
+            self.entries = []
+
+
+@contextmanager
+def audit_batch(user=None):
+    current = getattr(_local, 'batch', None)
+    if current is not None:
+        yield current
+        return
+
+    batch = _local.batch = AuditBatch(user)
+    try:
+        yield batch
+    finally:
+        _local.batch = None
+    # Runs immediately outside a transaction; dropped if the transaction rolls back
+    transaction.on_commit(batch.flush)
+
+
+def record(component_id, delta, reason, request_id=None):
+    """Adds an entry to the current batch (or a one-off batch outside of one)."""
+    with audit_batch() as batch:
+        batch.add(component_id, delta, reason, request_id)
+
+
+def audited(view):
+    """Wraps a view in one audit batch attributed to the requesting user."""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with audit_batch(request.user):
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+# --- QUERIES (served by the indexes on component/created_at) ---
+
+def entries_for_component(component_id, start=None, end=None):
+    return _in_range(StockAuditEntry.objects.filter(component_id=component_id), start, end)
+
+
+def entries_between(start=None, end=None):
+    return _in_range(StockAuditEntry.objects.all(), start, end)
+
+
+def _in_range(queryset, start, end):
+    if start:
+        queryset = queryset.filter(created_at__gte=start)
+    if end:
+        queryset = queryset.filter(created_at__lte=end)
+    return queryset.order_by('-created_at', '-id')
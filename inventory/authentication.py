@@ -0,0 +1,101 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+User = get_user_model()
+
+CACHE_PREFIX = 'authtoken:'
+
+# What views and permission checks read from request.user; everything else (the
+# password hash above all) stays out of the shared cache and loads lazily if needed.
+CACHED_USER_FIELDS = ('id', 'username', 'first_name', 'last_name', 'role', 'roll_number', 'is_staff', 'is_superuser', 'is_active')
+
+
+def token_ttl():
+    """Seconds a token->user entry stays in the cache (settings.TOKEN_CACHE_TTL)."""
+    return getattr(settings, 'TOKEN_CACHE_TTL', 300)
+
+
+def token_expiry():
+    """Optional token lifetime in seconds (settings.TOKEN_EXPIRE_SECONDS). None = never expire."""
+    return getattr(settings, 'TOKEN_EXPIRE_SECONDS', None)
+
+
+def is_token_expired(created):
+    expiry = token_expiry()
+    if not expiry:
+        return False
+    return created < timezone.now() - timedelta(seconds=expiry)
+
+
+def invalidate_token(key):
+    cache.delete(CACHE_PREFIX + key)
+
+
+def invalidate_user_tokens(user_id):
+    for key in Token.objects.filter(user_id=user_id).values_list('key', flat=True):
+        invalidate_token(key)
+
+
+def _loaded(model, values):
+    """
+    An instance as if loaded from the DB with only ``values`` (by attname); the rest are deferred.
+    Unlike model(**values), it isn't "adding", so the router isn't asked for a write alias.
+    """
+    names = [f.attname for f in model._meta.concrete_fields if f.attname in values]
+    return model.from_db('default', names, [values[name] for name in names])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Drop-in replacement for DRF's TokenAuthentication.
+    The Token+User JOIN is only run on a cache miss; hits cost zero queries.
+    The cache holds the token's creation time and CACHED_USER_FIELDS, not model instances.
+    """
+
+    def authenticate_credentials(self, key):
+        cached = cache.get(CACHE_PREFIX + key)
+        if cached is None:
+            try:
+                token = Token.objects.select_related('user').only('key', 'created', *(f'user__{f}' for f in CACHED_USER_FIELDS)).get(key=key)
+            except Token.DoesNotExist:
+                raise AuthenticationFailed('Invalid token.')
+            cached = ({f: getattr(token.user, f) for f in CACHED_USER_FIELDS}, token.created)
+            cache.set(CACHE_PREFIX + key, cached, token_ttl())
+
+        fields, created = cached
+        user = _loaded(User, fields)
+        if not user.is_active:
+            invalidate_token(key)
+            raise AuthenticationFailed('User inactive or deleted.')
+        if is_token_expired(created):
+            invalidate_token(key)
+            raise AuthenticationFailed('Token has expired.')
+        token = _loaded(Token, {'key': key, 'user_id': user.pk, 'created': created})
+        token.user = user
+        return (user, token)
+
+
+# --- CACHE INVALIDATION ---
+# Deleting a Token covers logout and rotation; saving a User covers deactivation
+# (and any other change like is_staff, so the cached user is never stale).
+
+def _token_deleted(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+def _user_saved(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_user_tokens(instance.pk)
+
+
+post_delete.connect(_token_deleted, sender=Token, dispatch_uid='authtoken_cache_token_deleted')
+post_save.connect(_user_saved, sender=User, dispatch_uid='authtoken_cache_user_saved')
@@ -0,0 +1,83 @@
+import functools
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from rest_framework.response import Response
+
+from .routers import pinned_to_primary
+
+GENERATION_KEY = 'coalesce:generation'
+
+
+def coalesce_ttl():
+    """Seconds an identical polling response is shared (settings.COALESCE_TTL)."""
+    return getattr(settings, 'COALESCE_TTL', 2)
+
+
+def invalidate_coalesced():
+    """
+    Call after any write that changes request/stock data so polls see it immediately.
+    Inside a transaction, defer it with ``transaction.on_commit(invalidate_coalesced)``.
+    """
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1, None)
+
+
+def _cache_key(request, name):
+    # Normalized query: sorted params, repeated values kept in order
+    params = sorted((k, tuple(request.query_params.getlist(k))) for k in request.query_params)
+    generation = cache.get_or_set(GENERATION_KEY, 0, None)
+    raw = f"{name}|{request.get_host()}|{request.path}|{params}|{generation}"
+    return 'coalesce:' + hashlib.sha1(raw.encode()).hexdigest()
+
+
+def coalesce(view):
+    """
+    Shares one computed response between identical concurrent GET requests.
+
+    The first caller takes a short lock and computes; callers arriving meanwhile wait
+    for its result instead of hitting the database (single-flight). Results live for
+    COALESCE_TTL seconds. Only 200 responses are shared, and only the data is cached,
+    so each client still gets its own content negotiation/rendering.
+
+    Clients pinned to the primary after a write (read-your-writes, see routers.py)
+    bypass it: a shared response may have been computed from a lagging replica.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        ttl = coalesce_ttl()
+        if request.method != 'GET' or not ttl or pinned_to_primary():
+            return view(request, *args, **kwargs)
+
+        key = _cache_key(request, view.__name__)
+        lock_key = key + ':lock'
+        cached = cache.get(key)
+        holding_lock = False
+        if cached is None:
+            holding_lock = cache.add(lock_key, 1, timeout=30)
+            if not holding_lock:
+                # Someone else is computing the same response: wait for it (bounded)
+                deadline = time.monotonic() + 5
+                while cached is None and time.monotonic() < deadline and cache.get(lock_key):
+                    time.sleep(0.02)
+                    cached = cache.get(key)
+                if cached is None:
+                    cached = cache.get(key)
+        if cached is not None:
+            return Response(cached)
+
+        try:
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.data, ttl)
+        finally:
+            if holding_lock:
+                cache.delete(lock_key)
+        return response
+
+    return wrapper
@@ -0,0 +1,194 @@
+"""
+Demand forecasting and restock recommendations.
+
+Nightly flow (``manage.py refresh_forecasts``):
+  1. ``rollup_daily_demand`` folds new RequestItem history into ComponentDailyDemand
+     with one grouped aggregate query per table (live + archive), starting from the
+     last rolled-up day so each night only touches recent rows. Older days are
+     recomputed too when they hold requests that are still open, since issuing at
+     the counter edits ``issued_quantity`` after the day was rolled up.
+  2. ``compute_recommendations`` loads the rollup into a components x days NumPy
+     matrix and computes moving averages, semester peaks and reorder points for
+     every component at once, then upserts RestockRecommendation. The suggested
+     order covers the reorder point minus what the lab already owns: units on the
+     shelf plus units on loan (they come back), capped at total_quantity.
+
+Edits outside the counter flows (e.g. fixing an old returned request in the admin)
+are picked up by ``refresh_forecasts --full``.
+"""
+import math
+from datetime import datetime, timedelta
+
+import numpy as np
+from django.db import transaction
+from django.db.models import F, Max, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import (
+    ArchivedRequestItem, Component, ComponentDailyDemand, Request, RequestItem, RestockRecommendation,
+)
+from .students import OPEN_STATUSES
+
+LEAD_TIME_DAYS = 7       # Typical time for an order to arrive
+SERVICE_Z = 1.65         # ~95% chance of not running out during the lead time
+HISTORY_DAYS = 3 * 365   # How far back the forecast looks
+
+
+def _daily_totals(model, since, days=()):
+    rows = model.objects.all()
+    if since:
+        rows = rows.filter(
+            Q(request__requested_at__gte=datetime.combine(since, datetime.min.time()))
+            | Q(request__requested_at__date__in=days)
+        )
+    return (
+        rows.annotate(day=TruncDate('request__requested_at'))
+        .values('component_id', 'day')
+        .annotate(requested=Sum('quantity'), issued=Sum('issued_quantity'))
+        .order_by()
+    )
+
+
+def open_request_days(before):
+    """Days before ``before`` with requests still open: their items can still be issued."""
+    return set(
+        Request.objects.filter(status__in=OPEN_STATUSES, requested_at__lt=datetime.combine(before, datetime.min.time()))
+        .annotate(day=TruncDate('requested_at'))
+        .values_list('day', flat=True)
+        .distinct()
+    )
+
+
+@transaction.atomic
+def rollup_daily_demand(full=False):
+    """
+    Rebuilds ComponentDailyDemand from request history. Incremental by default: the last
+    rolled-up day is recomputed (it may have been partial) along with everything after it
+    and every earlier day that still has open requests. Returns the number of
+    (component, day) rows written.
+    """
+    since = None if full else ComponentDailyDemand.objects.aggregate(last=Max('day'))['last']
+    days = open_request_days(since) if since else set()
+
+    totals = {}
+    for model in (RequestItem, ArchivedRequestItem):
+        for row in _daily_totals(model, since, days):
+            key = (row['component_id'], row['day'])
+            requested, issued = totals.get(key, (0, 0))
+            totals[key] = (requested + row['requested'], issued + row['issued'])
+
+    # Replace the whole window, so lines deleted since the last run drop out too
+    stale = ComponentDailyDemand.objects.all()
+    if since:
+        stale = stale.filter(Q(day__gte=since) | Q(day__in=days))
+    stale.delete()
+    ComponentDailyDemand.objects.bulk_create(
+        [
+            ComponentDailyDemand(component_id=component_id, day=day, requested=requested, issued=issued)
+            for (component_id, day), (requested, issued) in totals.items()
+        ],
+        batch_size=1000,
+    )
+    return len(totals)
+
+
+def _semester(days):
+    """Semester index per day: two per year (Jan-Jun, Jul-Dec)."""
+    years = days.astype('datetime64[Y]').astype(int)
+    months = days.astype('datetime64[M]').astype(int) % 12
+    return years * 2 + (months >= 6)
+
+
+def demand_statistics(component_ids, rows, today, history_days=HISTORY_DAYS):
+    """
+    Vectorized stats for ``component_ids`` from rollup ``rows`` of (component_id, day, requested).
+    Returns a dict of arrays aligned with ``component_ids``.
+    """
+    start = np.datetime64(today - timedelta(days=history_days - 1), 'D')
+    n_days = history_days
+    index = {pk: i for i, pk in enumerate(component_ids)}
+    matrix = np.zeros((len(component_ids), n_days))
+
+    if rows:
+        comp, day, qty = zip(*rows)
+        rows_idx = np.fromiter((index.get(c, -1) for c in comp), dtype=np.int64, count=len(comp))
+        cols_idx = (np.array(day, dtype='datetime64[D]') - start).astype(np.int64)
+        keep = (rows_idx >= 0) & (cols_idx >= 0) & (cols_idx < n_days)
+        np.add.at(matrix, (rows_idx[keep], cols_idx[keep]), np.array(qty, dtype=float)[keep])
+
+    avg_7 = matrix[:, -7:].mean(axis=1)
+    avg_28 = matrix[:, -28:].mean(axis=1)
+    std_28 = matrix[:, -28:].std(axis=1)
+
+    # Mean daily demand per semester, then the peak among semesters in the same
+    # half of the year as today (a July rush predicts next July's rush)
+    semesters = _semester(start + np.arange(n_days))
+    sem_ids, sem_index = np.unique(semesters, return_inverse=True)
+    one_hot = sem_index[:, None] == np.arange(len(sem_ids))
+    sem_means = (matrix @ one_hot) / one_hot.sum(axis=0)
+    same_half = (sem_ids % 2) == _semester(np.array([np.datetime64(today, 'D')]))[0] % 2
+    semester_peak = sem_means[:, same_half].max(axis=1) if same_half.any() else np.zeros(len(component_ids))
+
+    return {'avg_7': avg_7, 'avg_28': avg_28, 'std_28': std_28, 'semester_peak': semester_peak}
+
+
+def outstanding_loans():
+    """{component_id: units issued and not yet returned} for requests still out."""
+    return dict(
+        RequestItem.objects.filter(request__status='collected')
+        .values('component_id')
+        .annotate(out=Sum(F('issued_quantity') - F('returned_quantity')))
+        .order_by()
+        .values_list('component_id', 'out')
+    )
+
+
+def compute_recommendations(today=None, lead_time_days=LEAD_TIME_DAYS, history_days=HISTORY_DAYS):
+    """Recomputes RestockRecommendation for every component from the daily rollup."""
+    today = today or timezone.now().date()
+    components = list(Component.objects.values_list('id', 'available_quantity', 'total_quantity'))
+    if not components:
+        return 0
+    component_ids = [pk for pk, _, _ in components]
+
+    rows = list(
+        ComponentDailyDemand.objects.filter(day__gt=today - timedelta(days=history_days))
+        .values_list('component_id', 'day', 'requested')
+    )
+    stats = demand_statistics(component_ids, rows, today, history_days)
+    outstanding = outstanding_loans()
+
+    daily_rate = np.maximum(stats['avg_28'], stats['semester_peak'])
+    reorder_points = np.ceil(
+        daily_rate * lead_time_days + SERVICE_Z * stats['std_28'] * math.sqrt(lead_time_days)
+    ).astype(int)
+    available = np.array([available for _, available, _ in components])
+    total = np.array([total for _, _, total in components])
+    on_loan = np.array([outstanding.get(pk) or 0 for pk in component_ids])
+    # Stock the lab already owns: on the shelf plus out on loan (capped: totals can be stale)
+    owned = np.minimum(available + on_loan, np.maximum(total, available))
+    suggested = np.maximum(reorder_points - owned, 0)
+
+    RestockRecommendation.objects.bulk_create(
+        [
+            RestockRecommendation(
+                component_id=pk,
+                avg_daily_7=float(stats['avg_7'][i]),
+                avg_daily_28=float(stats['avg_28'][i]),
+                semester_peak=float(stats['semester_peak'][i]),
+                outstanding=int(on_loan[i]),
+                reorder_point=int(reorder_points[i]),
+                suggested_order=int(suggested[i]),
+            )
+            for i, pk in enumerate(component_ids)
+        ],
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['component'],
+        update_fields=[
+            'avg_daily_7', 'avg_daily_28', 'semester_peak', 'outstanding',
+            'reorder_point', 'suggested_order', 'computed_at',
+        ],
+    )
+    return len(component_ids)
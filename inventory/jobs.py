@@ -0,0 +1,163 @@
+"""
+Lightweight DB-backed job queue. No broker: the Job table is the queue.
+
+    @task('export_requests_csv')
+    def export_requests_csv(job, request_ids): ...
+
+    enqueue('export_requests_csv', request_ids=[1, 2, 3], user=request.user)
+
+`manage.py runworker` claims queued jobs (SELECT ... FOR UPDATE SKIP LOCKED on
+Postgres, a conditional UPDATE everywhere) and runs them on a thread pool.
+Failed jobs are retried with exponential backoff up to ``max_attempts``.
+Tests and scripts can drain the queue synchronously with ``run_pending_jobs()``.
+
+A running job's ``heartbeat_at`` is refreshed by a background thread; when a
+worker crashes or is killed, its jobs stop heartbeating and, once older than
+settings.JOB_LEASE_SECONDS, ``reclaim_stale_jobs`` requeues them (counting the
+lost run as an attempt). Workers reclaim every so often while polling.
+"""
+import logging
+import random
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import OperationalError, close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+
+def task(name):
+    """Registers a function as a job handler. It's called as ``func(job, **job.payload)``."""
+    def register(func):
+        TASKS[name] = func
+        return func
+    return register
+
+
+def enqueue(name, user=None, max_attempts=3, **payload):
+    if name not in TASKS:
+        raise ValueError(f"Unknown task: {name}")
+    return Job.objects.create(name=name, payload=payload, created_by=user, max_attempts=max_attempts)
+
+
+def lease_seconds():
+    return getattr(settings, 'JOB_LEASE_SECONDS', 300)
+
+
+def reclaim_stale_jobs(now=None):
+    """
+    Requeues running jobs whose worker stopped heartbeating, or fails them if that was
+    their last attempt. Returns the number of jobs reclaimed.
+    """
+    now = now or timezone.now()
+    stale = Job.objects.filter(status='running', heartbeat_at__lt=now - timedelta(seconds=lease_seconds()))
+    error = f"Worker stopped responding (no heartbeat for {lease_seconds()}s)"
+    # Conditional updates: a worker that is merely slow and finishes meanwhile keeps its result
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(status='failed', error=error, finished_at=now)
+    requeued = stale.update(status='queued', error=error, run_after=now)
+    if failed or requeued:
+        logger.warning("Reclaimed %s stale jobs (%s failed)", failed + requeued, failed)
+    return failed + requeued
+
+
+def claim_job():
+    """Atomically takes the oldest runnable job, or returns None."""
+    with transaction.atomic():
+        job = (
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status='queued', run_after__lte=timezone.now())
+            .order_by('run_after', 'id')
+            .first()
+        )
+        if job is None:
+            return None
+        # Conditional update keeps the claim safe on databases without row locks
+        now = timezone.now()
+        claimed = Job.objects.filter(pk=job.pk, status='queued').update(
+            status='running', started_at=now, heartbeat_at=now, attempts=job.attempts + 1,
+        )
+    if not claimed:
+        return None
+    job.refresh_from_db()
+    return job
+
+
+def _heartbeat(job_id, stop):
+    """Keeps a running job's lease alive until ``stop`` is set (runs in its own thread)."""
+    try:
+        while not stop.wait(lease_seconds() / 4):
+            Job.objects.filter(pk=job_id, status='running').update(heartbeat_at=timezone.now())
+    finally:
+        connection.close()
+
+
+def run_job(job):
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(job.pk, stop), daemon=True)
+    heartbeat.start()
+    try:
+        result = TASKS[job.name](job, **job.payload)
+    except Exception as exc:
+        logger.exception("Job %s (%s) failed", job.pk, job.name)
+        job.error = ''.join(traceback.format_exception(exc))
+        if job.attempts < job.max_attempts:
+            job.status = 'queued'
+            job.run_after = timezone.now() + timedelta(seconds=2 ** job.attempts)
+        else:
+            job.status = 'failed'
+            job.finished_at = timezone.now()
+    else:
+        job.status = 'succeeded'
+        job.result = result
+        job.error = ''
+        job.finished_at = timezone.now()
+    finally:
+        stop.set()
+        heartbeat.join()
+    job.save()
+    return job
+
+
+def work(stop_when_empty=False, poll_interval=1.0, stop_event=None):
+    """Worker loop for one thread: claim, run, repeat."""
+    next_reclaim = 0
+    while stop_event is None or not stop_event.is_set():
+        close_old_connections()
+        try:
+            if time.monotonic() >= next_reclaim:
+                reclaim_stale_jobs()
+                next_reclaim = time.monotonic() + lease_seconds() / 2
+            job = claim_job()
+        except OperationalError:
+            # Lock contention between worker threads (SQLite); just try again
+            time.sleep(random.uniform(0.05, 0.2))
+            continue
+        if job is None:
+            if stop_when_empty:
+                break
+            if stop_event is not None:
+                stop_event.wait(poll_interval)
+            else:
+                time.sleep(poll_interval)
+            continue
+        run_job(job)
+    close_old_connections()
+
+
+def run_pending_jobs():
+    """Runs every runnable job in the current thread. Returns how many were run."""
+    reclaim_stale_jobs()
+    count = 0
+    while (job := claim_job()) is not None:
+        run_job(job)
+        count += 1
+    return count
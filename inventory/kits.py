@@ -0,0 +1,81 @@
+from django.db.models import F, Min, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Kit, KitComponent, Request, RequestItem
+
+
+def kits_with_availability():
+    """
+    Kits annotated with ``available_kits``: how many full kits can be issued right now,
+    i.e. min over lines of available_quantity // quantity. One grouped query for all kits.
+    """
+    return Kit.objects.annotate(
+        available_kits=Coalesce(
+            Greatest(Min(F('lines__component__available_quantity') / F('lines__quantity')), Value(0)),
+            Value(0),
+        )
+    )
+
+
+def parse_count(value, what):
+    """A form quantity as an int: blank means 0; raises ValueError (with a message for the form) otherwise."""
+    value = (value or '').strip()
+    if not value:
+        return 0
+    try:
+        count = int(value)
+    except ValueError:
+        raise ValueError(f"{what} must be a whole number")
+    if count < 0:
+        raise ValueError(f"{what} can't be negative")
+    return count
+
+
+def requested_kits(kit_ids, kit_quantities):
+    """
+    {kit id: number of kits} from the form's parallel kit_id[]/kit_quantity[] lists, skipping
+    blanks and zeros. Raises ValueError for bad numbers, unknown kits, or more kits than can
+    be issued right now (kit lines don't go to the waitlist, so they must be in stock).
+    """
+    wanted = {}
+    for pk, qty in zip(kit_ids, kit_quantities):
+        count = parse_count(qty, "Kit quantity")
+        if pk and count:
+            try:
+                pk = int(pk)
+            except ValueError:
+                raise ValueError("Unknown kit")
+            wanted[pk] = wanted.get(pk, 0) + count
+    if not wanted:
+        return {}
+
+    available = {pk: (name, kits) for pk, name, kits in
+                 kits_with_availability().filter(pk__in=wanted).values_list('id', 'name', 'available_kits')}
+    for pk, count in wanted.items():
+        if pk not in available:
+            raise ValueError("Unknown kit")
+        name, kits = available[pk]
+        if count > kits:
+            raise ValueError(f"Only {kits} {name} kit{'s' if kits != 1 else ''} available right now")
+    return wanted
+
+
+def expand_kits(item_request, kit_quantities):
+    """
+    Adds the component lines of each requested kit to ``item_request``.
+    ``kit_quantities`` maps kit id -> number of kits (see ``requested_kits``). Returns the created RequestItems.
+    """
+    kit_quantities = {pk: qty for pk, qty in kit_quantities.items() if qty > 0}
+    lines = KitComponent.objects.filter(kit_id__in=kit_quantities)
+    items = RequestItem.objects.bulk_create([
+        RequestItem(
+            request=item_request,
+            component_id=line.component_id,
+            quantity=line.quantity * kit_quantities[line.kit_id],
+            kit_id=line.kit_id,
+        )
+        for line in lines
+    ])
+    if items:
+        Request.refresh_totals(Request.objects.filter(pk=item_request.pk))
+    return items
@@ -0,0 +1,55 @@
+from .models import Category, Component
+
+
+class LookupCache:
+    """
+    Per-response identity map for Component/Category rows.
+
+    Pass one instance through serializer ``context['lookups']`` for a whole list
+    response. Each component is loaded at most once and all categories are loaded
+    once as an id -> name dict, no matter how many RequestItems reference them.
+    """
+
+    def __init__(self):
+        self._components = {}
+        self._categories = None
+        # Number of DB round trips made, handy for tests and debugging
+        self.component_queries = 0
+        self.category_queries = 0
+
+    @classmethod
+    def for_requests(cls, requests):
+        """Builds a cache primed with every component used by ``requests`` (items prefetched)."""
+        lookups = cls()
+        lookups.prime_components(
+            item.component_id for req in requests for item in req.items.all()
+        )
+        return lookups
+
+    def prime_components(self, ids):
+        missing = set(ids) - self._components.keys()
+        if not missing:
+            return
+        self.component_queries += 1
+        for component in Component.objects.for_listing().filter(pk__in=missing):
+            self._components[component.pk] = component
+
+    def component(self, pk):
+        self.prime_components([pk])
+        return self._components.get(pk)
+
+    def component_name(self, pk):
+        component = self.component(pk)
+        return component.name if component else None
+
+    def categories(self):
+        if self._categories is None:
+            self.category_queries += 1
+            self._categories = dict(Category.objects.values_list('id', 'name'))
+        return self._categories
+
+    def category_name(self, component_pk):
+        component = self.component(component_pk)
+        if component is None:
+            return None
+        return self.categories().get(component.category_id)
@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from inventory.archive import archive_finished_requests
+
+
+class Command(BaseCommand):
+    help = "Moves returned/rejected requests older than N months (and their items) to the archive tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=6)
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=30 * options['months'])
+        moved = archive_finished_requests(before, chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} requests made before {before:%Y-%m-%d}"))
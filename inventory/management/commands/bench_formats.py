@@ -0,0 +1,67 @@
+import gzip
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from rest_framework.renderers import JSONRenderer
+
+from inventory.renderers import CompactJSONRenderer, MessagePackRenderer, msgpack
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def fake_history(rows):
+    """History rows shaped exactly like ItemRequestSerializer output."""
+    components = [('Arduino Uno', 'Boards'), ('DHT11', 'Sensors'), ('Breadboard', 'Prototyping'),
+                  ('Jumper Set', 'Prototyping'), ('HC-SR04', 'Sensors'), ('ESP32', 'Boards')]
+    data = []
+    for pk in range(1, rows + 1):
+        items = []
+        for item_pk in range(random.randint(1, 4)):
+            name, category = random.choice(components)
+            qty = random.randint(1, 5)
+            items.append({
+                'id': pk * 10 + item_pk, 'component': components.index((name, category)) + 1,
+                'component_name': name, 'category_name': category,
+                'quantity': qty, 'issued_quantity': qty, 'returned_quantity': qty,
+            })
+        data.append({
+            'id': pk, 'student_name': f'Student {pk % 500}', 'student_id': f'MEC{pk % 500:05d}',
+            'status': 'returned', 'items': items,
+            'requested_at': '2026-03-01T10:15:00', 'collected_at': '2026-03-01T11:00:00',
+            'return_date': '2026-03-08T16:30:00',
+        })
+    return data
+
+
+class Command(BaseCommand):
+    help = "Reports bytes on the wire and encode time of each API response format for history payloads."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000])
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        renderers = [('json', JSONRenderer()), ('compact', CompactJSONRenderer())]
+        if msgpack is not None:
+            renderers.append(('msgpack', MessagePackRenderer()))
+        else:
+            self.stdout.write("msgpack not installed, skipping MessagePack")
+
+        random.seed(0)
+        for rows in options['rows']:
+            data = fake_history(rows)
+            self.stdout.write(f"\n{rows} rows")
+            self.stdout.write(f"{'format':<10}{'raw bytes':>12}{'gzip':>10}{'brotli':>10}{'encode ms':>12}")
+            for name, renderer in renderers:
+                start = time.perf_counter()
+                for _ in range(options['repeat']):
+                    body = renderer.render(data)
+                encode_ms = (time.perf_counter() - start) * 1000 / options['repeat']
+                gz = len(gzip.compress(body, compresslevel=6))
+                br = len(brotli.compress(body, quality=5)) if brotli else '-'
+                self.stdout.write(f"{name:<10}{len(body):>12}{gz:>10}{br:>10}{encode_ms:>12.1f}")
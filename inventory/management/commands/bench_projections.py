@@ -0,0 +1,78 @@
+import time
+import tracemalloc
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from inventory.models import Category, Component, Request
+
+
+class Rollback(Exception):
+    pass
+
+
+def measure(queryset):
+    """(columns, bytes per row, peak KiB to materialize, ms) for one evaluation of ``queryset``."""
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        columns = len(cursor.description)
+        rows = cursor.fetchall()
+    row_bytes = sum(len(str(value)) for row in rows for value in row if value is not None) / max(len(rows), 1)
+
+    start = time.perf_counter()
+    list(queryset._chain())
+    elapsed = (time.perf_counter() - start) * 1000
+
+    # Separate pass: tracemalloc slows allocation down too much to time under it
+    tracemalloc.start()
+    objects = list(queryset._chain())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return columns, row_bytes, peak / 1024, elapsed
+
+
+class Command(BaseCommand):
+    help = "Compares full-row loads with the for_listing()/for_serialization() projections on large lists."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        # Synthetic rows live only inside this transaction
+        try:
+            with transaction.atomic():
+                self.seed(options['rows'])
+                self.report()
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, rows):
+        User = get_user_model()
+        category = Category.objects.create(name='Bench category')
+        users = User.objects.bulk_create([
+            User(username=f'bench{n}@college.edu', first_name=f'Bench {n}', email=f'bench{n}@college.edu',
+                 password='pbkdf2_sha256$1000000$' + 'x' * 66, role='student')
+            for n in range(rows)
+        ])
+        Component.objects.bulk_create([
+            Component(name=f'Bench part {n}', category=category, total_quantity=10, available_quantity=10)
+            for n in range(rows)
+        ])
+        Request.objects.bulk_create([Request(student=user) for user in users])
+
+    def report(self):
+        User = get_user_model()
+        cases = [
+            ('users', User.objects.all(), User.objects.for_listing()),
+            ('components', Component.objects.select_related('category'), Component.objects.for_serialization()),
+            ('requests+student', Request.objects.select_related('student'), Request.objects.with_student()),
+        ]
+        self.stdout.write(f"{'list':<18}{'variant':<12}{'columns':>8}{'bytes/row':>11}{'peak KiB':>10}{'ms':>9}")
+        for label, full, projected in cases:
+            for variant, queryset in (('full', full), ('projected', projected)):
+                columns, row_bytes, peak, elapsed = measure(queryset)
+                self.stdout.write(f"{label:<18}{variant:<12}{columns:>8}{row_bytes:>11.0f}{peak:>10.0f}{elapsed:>9.1f}")
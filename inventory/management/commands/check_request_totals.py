@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from inventory.models import Request
+
+
+class Command(BaseCommand):
+    help = "Compares each Request's denormalized totals with its items; --repair rewrites the ones that drifted."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repair', action='store_true')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        chunk = options['chunk_size']
+        last_pk = 0
+        drifted = 0
+        while True:
+            ids = list(Request.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:chunk])
+            if not ids:
+                break
+            last_pk = ids[-1]
+            queryset = Request.objects.filter(pk__in=ids)
+            if options['repair']:
+                stale = Request.refresh_totals(queryset)
+            else:
+                totals = Request.computed_totals(queryset)
+                empty = dict.fromkeys(Request.TOTAL_FIELDS, 0)
+                stale = [
+                    row for row in queryset.values('pk', *Request.TOTAL_FIELDS)
+                    if any(row[f] != v for f, v in totals.get(row['pk'], empty).items())
+                ]
+            drifted += len(stale)
+
+        action = "Repaired" if options['repair'] else "Found"
+        style = self.style.SUCCESS if not drifted or options['repair'] else self.style.WARNING
+        self.stdout.write(style(f"{action} {drifted} requests with inconsistent totals"))
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from inventory.forecasting import compute_recommendations, rollup_daily_demand
+
+
+class Command(BaseCommand):
+    help = "Rolls up new request history into daily demand and recomputes restock recommendations (run nightly)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Rebuild the daily rollup from all history")
+        parser.add_argument('--lead-time', type=int, default=7, help="Days for an order to arrive")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        days = rollup_daily_demand(full=options['full'])
+        components = compute_recommendations(lead_time_days=options['lead_time'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rolled up {days} component-days, updated {components} recommendations "
+            f"in {time.perf_counter() - start:.2f}s"
+        ))
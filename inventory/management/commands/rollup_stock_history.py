@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from inventory.stock_history import prune, rollup_daily, rollup_hourly
+
+
+class Command(BaseCommand):
+    help = "Rolls raw stock-level points up into hourly/daily tables and prunes expired rows (run hourly)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Rebuild the rollups from all retained rows")
+        parser.add_argument('--no-prune', action='store_true')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        hours = rollup_hourly(full=options['full'])
+        days = rollup_daily(full=options['full'])
+        deleted = {} if options['no_prune'] else prune()
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {hours} hourly and {days} daily rows, pruned {deleted or 'nothing'} "
+            f"in {time.perf_counter() - start:.2f}s"
+        ))
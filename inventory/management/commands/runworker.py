@@ -0,0 +1,32 @@
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from inventory.jobs import work
+
+
+class Command(BaseCommand):
+    help = "Runs background jobs from the Job table. Start more processes to use more cores."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--poll-interval', type=float, default=1.0)
+        parser.add_argument('--once', action='store_true', help="Exit when the queue is empty")
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        if not options['once']:
+            signal.signal(signal.SIGTERM, lambda *_: stop.set())
+            signal.signal(signal.SIGINT, lambda *_: stop.set())
+
+        self.stdout.write(f"Worker started with {options['threads']} threads")
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            futures = [
+                pool.submit(work, options['once'], options['poll_interval'], stop)
+                for _ in range(options['threads'])
+            ]
+            for future in futures:
+                future.result()
+        self.stdout.write("Worker stopped")
@@ -0,0 +1,42 @@
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # Optional: falls back to gzip only
+    brotli = None
+
+
+class APICompressionMiddleware(GZipMiddleware):
+    """
+    Compresses /api/ responses with brotli (if installed and accepted) or gzip.
+
+    Limited to the API so HTML pages carrying CSRF tokens aren't exposed to BREACH.
+    """
+    min_length = 200
+
+    def process_response(self, request, response):
+        if not request.path.startswith('/api/'):
+            return response
+
+        accept = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if (
+            brotli is None
+            or 'br' not in accept
+            or response.streaming
+            or response.has_header('Content-Encoding')
+            or len(response.content) < self.min_length
+        ):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressed = brotli.compress(response.content, quality=5)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.11 on 2026-10-19 05:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0010_archivedrequest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RestockRecommendation',
+            fields=[
+                ('component', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='restock', serialize=False, to='inventory.component')),
+                ('avg_daily_7', models.FloatField(default=0)),
+                ('avg_daily_28', models.FloatField(default=0)),
+                ('semester_peak', models.FloatField(default=0)),
+                ('outstanding', models.IntegerField(default=0)),
+                ('reorder_point', models.IntegerField(default=0)),
+                ('suggested_order', models.IntegerField(default=0)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='request',
+            name='requested_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.CreateModel(
+            name='ComponentDailyDemand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(db_index=True)),
+                ('requested', models.PositiveIntegerField(default=0)),
+                ('issued', models.PositiveIntegerField(default=0)),
+                ('component', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_demand', to='inventory.component')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('component', 'day'), name='unique_component_day_demand')],
+            },
+        ),
+    ]
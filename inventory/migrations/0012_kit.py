@@ -0,0 +1,48 @@
+# Generated by Django 5.2.11 on 2026-10-19 05:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0011_demand_forecasting'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Kit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('description', models.TextField(blank=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Kits',
+            },
+        ),
+        migrations.AddField(
+            model_name='requestitem',
+            name='kit',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='inventory.kit'),
+        ),
+        migrations.CreateModel(
+            name='KitComponent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('component', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='inventory.component')),
+                ('kit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='inventory.kit')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='kit',
+            name='components',
+            field=models.ManyToManyField(related_name='kits', through='inventory.KitComponent', to='inventory.component'),
+        ),
+        migrations.AddConstraint(
+            model_name='kitcomponent',
+            constraint=models.UniqueConstraint(fields=('kit', 'component'), name='unique_kit_component'),
+        ),
+    ]
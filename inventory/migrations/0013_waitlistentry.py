@@ -0,0 +1,34 @@
+# Generated by Django 5.2.11 on 2026-10-19 05:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0012_kit'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField()),
+                ('priority', models.IntegerField(default=0)),
+                ('status', models.CharField(choices=[('waiting', 'Waiting'), ('allocated', 'Allocated'), ('cancelled', 'Cancelled')], default='waiting', max_length=20)),
+                ('requested_at', models.DateTimeField(auto_now_add=True)),
+                ('allocated_at', models.DateTimeField(blank=True, null=True)),
+                ('component', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist', to='inventory.component')),
+                ('request', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='waitlist_entries', to='inventory.request')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Waitlist entries',
+                'indexes': [models.Index(condition=models.Q(('status', 'waiting')), fields=['component', 'priority', 'requested_at'], name='waitlist_queue_idx')],
+            },
+        ),
+    ]
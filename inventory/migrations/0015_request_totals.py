@@ -0,0 +1,89 @@
+# Generated by Django 5.2.11 on 2026-10-19 06:04
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_totals(apps, schema_editor):
+    Request = apps.get_model('inventory', 'Request')
+    RequestItem = apps.get_model('inventory', 'RequestItem')
+    rows = (
+        RequestItem.objects.values('request_id')
+        .annotate(lines=Count('id'), requested=Sum('quantity'), issued=Sum('issued_quantity'), returned=Sum('returned_quantity'))
+        .order_by()
+    )
+    updated = [
+        Request(
+            pk=row['request_id'],
+            line_count=row['lines'],
+            total_requested=row['requested'],
+            total_issued=row['issued'],
+            total_returned=row['returned'],
+            outstanding=row['issued'] - row['returned'],
+        )
+        for row in rows
+    ]
+    Request.objects.bulk_update(
+        updated, ['line_count', 'total_requested', 'total_issued', 'total_returned', 'outstanding'], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0014_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedrequest',
+            name='line_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='archivedrequest',
+            name='outstanding',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='archivedrequest',
+            name='total_issued',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='archivedrequest',
+            name='total_requested',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='archivedrequest',
+            name='total_returned',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='request',
+            name='line_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='request',
+            name='outstanding',
+            field=models.IntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='request',
+            name='total_issued',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='request',
+            name='total_requested',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='request',
+            name='total_returned',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_totals, migrations.RunPython.noop),
+    ]
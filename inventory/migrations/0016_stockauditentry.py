@@ -0,0 +1,33 @@
+# Generated by Django 5.2.11 on 2026-10-19 06:04
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0015_request_totals'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockAuditEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delta', models.IntegerField()),
+                ('reason', models.CharField(choices=[('issue', 'Issued'), ('return', 'Returned'), ('waitlist_reserve', 'Reserved for waitlist'), ('waitlist_release', 'Waitlist reservation released'), ('stock_added', 'Stock added'), ('admin_edit', 'Admin edit')], max_length=20)),
+                ('request_ref', models.BigIntegerField(blank=True, db_index=True, null=True)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('component', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='audit_entries', to='inventory.component')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_audit_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Stock audit entries',
+                'indexes': [models.Index(fields=['component', 'created_at'], name='audit_component_time_idx')],
+            },
+        ),
+    ]
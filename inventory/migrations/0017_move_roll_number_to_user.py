@@ -0,0 +1,53 @@
+from django.db import migrations
+
+
+def roll_number_clashes(rows):
+    """{roll number: [user ids]} for (user id, student_id_code) rows that only differ in case/whitespace."""
+    owners = {}
+    for user_id, code in rows:
+        roll_number = code.strip().upper()
+        if roll_number:
+            owners.setdefault(roll_number, []).append(user_id)
+    return {roll_number: ids for roll_number, ids in owners.items() if len(ids) > 1}
+
+
+def copy_roll_numbers(apps, schema_editor):
+    Student = apps.get_model('inventory', 'Student')
+    User = apps.get_model('users', 'User')
+    # User.roll_number is unique: report every clash up front instead of failing on the first
+    clashes = roll_number_clashes(Student.objects.values_list('user_id', 'student_id_code').iterator(chunk_size=1000))
+    if clashes:
+        listed = '; '.join(f"{code}: users {', '.join(map(str, ids))}" for code, ids in sorted(clashes.items()))
+        raise RuntimeError(
+            f"Student ID codes that differ only in case/whitespace would share a roll number. "
+            f"Fix them in inventory_student and migrate again. {listed}"
+        )
+    users = []
+    for student in Student.objects.select_related('user').iterator(chunk_size=1000):
+        student.user.roll_number = student.student_id_code.strip().upper() or None
+        users.append(student.user)
+    User.objects.bulk_update(users, ['roll_number'], batch_size=1000)
+
+
+def restore_profiles(apps, schema_editor):
+    Student = apps.get_model('inventory', 'Student')
+    User = apps.get_model('users', 'User')
+    Student.objects.bulk_create(
+        Student(user_id=pk, student_id_code=code)
+        for pk, code in User.objects.exclude(roll_number=None).values_list('id', 'roll_number')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0016_stockauditentry'),
+        ('users', '0003_user_roll_number'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_roll_numbers, restore_profiles),
+        migrations.DeleteModel(
+            name='Student',
+        ),
+    ]
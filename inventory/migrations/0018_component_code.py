@@ -0,0 +1,18 @@
+# Generated by Django 5.2.11 on 2026-10-19 06:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0017_move_roll_number_to_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='component',
+            name='code',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
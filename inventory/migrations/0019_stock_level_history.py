@@ -0,0 +1,72 @@
+# Generated by Django 5.2.11 on 2026-10-19 06:20
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def seed_levels(apps, schema_editor):
+    # Every trend starts from the level at deployment
+    Component = apps.get_model('inventory', 'Component')
+    StockLevelPoint = apps.get_model('inventory', 'StockLevelPoint')
+    now = django.utils.timezone.now()
+    StockLevelPoint.objects.bulk_create(
+        (StockLevelPoint(component_id=pk, at=now, level=level)
+         for pk, level in Component.objects.values_list('id', 'available_quantity')),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0018_component_code'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockLevelDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('open', models.IntegerField()),
+                ('low', models.IntegerField()),
+                ('high', models.IntegerField()),
+                ('close', models.IntegerField()),
+                ('samples', models.PositiveIntegerField(default=0)),
+                ('component', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.component')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('component', 'bucket'), name='unique_level_day')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockLevelHourly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('open', models.IntegerField()),
+                ('low', models.IntegerField()),
+                ('high', models.IntegerField()),
+                ('close', models.IntegerField()),
+                ('samples', models.PositiveIntegerField(default=0)),
+                ('component', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.component')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('component', 'bucket'), name='unique_level_hour')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockLevelPoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('level', models.IntegerField()),
+                ('component', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='level_points', to='inventory.component')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['component', 'at'], name='level_point_idx'), models.Index(fields=['at'], name='level_point_at_idx')],
+            },
+        ),
+        migrations.RunPython(seed_levels, migrations.RunPython.noop),
+    ]
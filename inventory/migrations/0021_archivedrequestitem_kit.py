@@ -0,0 +1,19 @@
+# Generated by Django 5.2.11 on 2026-10-19 06:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0020_job_heartbeat_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedrequestitem',
+            name='kit',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='inventory.kit'),
+        ),
+    ]
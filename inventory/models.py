@@ -1,6 +1,9 @@
 from django.db import models
 from django.conf import settings
 from django.forms import ValidationError
+from django.utils import timezone
+
+from users.models import deferred_user_fields
 
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -12,11 +15,26 @@ class Category(models.Model):
         return self.name
 
 
+class ComponentQuerySet(models.QuerySet):
+    def for_listing(self):
+        """Just what pickers and lookups show: name, stock and category id."""
+        return self.only('id', 'name', 'category_id', 'available_quantity')
+
+    def for_serialization(self):
+        """Everything ItemSerializer renders, with the category name joined in."""
+        return self.select_related('category').only(
+            'id', 'name', 'code', 'category', 'total_quantity', 'available_quantity', 'category__name',
+        )
+
+
 class Component(models.Model):
     name = models.CharField(max_length=100)
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
     total_quantity = models.IntegerField()
     available_quantity = models.IntegerField()
+    code = models.CharField(max_length=64, unique=True, null=True, blank=True) # Barcode/QR label printed on the bin
+
+    objects = ComponentQuerySet.as_manager()
 
     class Meta:
         verbose_name_plural = "Components"
@@ -24,6 +42,48 @@ class Component(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # Admin forms submit '' for an unlabelled component; NULLs don't collide on the unique index
+        self.code = (self.code or '').strip() or None
+        super().save(*args, **kwargs)
+
+
+class Kit(models.Model):
+    """A bundle students usually request together (e.g. Arduino + breadboard + jumper set)."""
+    name = models.CharField(max_length=100, unique=True)
+    description = models.TextField(blank=True)
+    components = models.ManyToManyField(Component, through='KitComponent', related_name='kits')
+
+    class Meta:
+        verbose_name_plural = "Kits"
+
+    def __str__(self):
+        return self.name
+
+
+class KitComponent(models.Model):
+    kit = models.ForeignKey(Kit, on_delete=models.CASCADE, related_name='lines')
+    component = models.ForeignKey(Component, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kit', 'component'], name='unique_kit_component'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.component.name}"
+
+
+class RequestQuerySet(models.QuerySet):
+    def with_student(self):
+        """Joins the student, loading only the columns lists print (no password hash etc.)."""
+        return self.select_related('student').defer(*deferred_user_fields('student'))
+
+    def for_listing(self):
+        """Everything ItemRequestSerializer reads from the request row and its student."""
+        return self.with_student()
+
 
 class Request(models.Model):
     STATUS_CHOICES = (
@@ -56,16 +116,90 @@ class Request(models.Model):
     )
     
 
-    requested_at = models.DateTimeField(auto_now_add=True)
+    requested_at = models.DateTimeField(auto_now_add=True, db_index=True)
     collected_at = models.DateTimeField(null=True, blank=True)
     return_deadline = models.DateField(null=True, blank=True)
     return_date = models.DateTimeField(null=True, blank=True)
+
+    # Denormalized item totals, kept in step by RequestItem.save()/delete() and
+    # Request.refresh_totals() (checked/repaired by `manage.py check_request_totals`)
+    line_count = models.PositiveIntegerField(default=0)
+    total_requested = models.PositiveIntegerField(default=0)
+    total_issued = models.PositiveIntegerField(default=0)
+    total_returned = models.PositiveIntegerField(default=0)
+    outstanding = models.IntegerField(default=0, db_index=True) # Issued but not yet returned
+
+    TOTAL_FIELDS = ['line_count', 'total_requested', 'total_issued', 'total_returned', 'outstanding']
+
+    objects = RequestQuerySet.as_manager()
+
     class Meta:
         verbose_name_plural = "Requests"
 
     def __str__(self):
         return f"Request #{self.id} by {self.student.username}"
 
+    def save(self, *args, **kwargs):
+        # The totals are only written through apply_totals_delta()/refresh_totals(), so a
+        # stale in-memory copy can't overwrite counts other writers have already updated
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.TOTAL_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+    @property
+    def all_returned(self):
+        return self.outstanding <= 0
+
+    @classmethod
+    def apply_totals_delta(cls, pk, lines=0, requested=0, issued=0, returned=0):
+        """Adjusts the counters in a single UPDATE, safe against concurrent writers."""
+        cls.objects.filter(pk=pk).update(
+            line_count=models.F('line_count') + lines,
+            total_requested=models.F('total_requested') + requested,
+            total_issued=models.F('total_issued') + issued,
+            total_returned=models.F('total_returned') + returned,
+            outstanding=models.F('outstanding') + issued - returned,
+        )
+
+    @classmethod
+    def computed_totals(cls, queryset):
+        """{request_id: {counter: value}} recomputed from RequestItem with one grouped query."""
+        rows = (
+            RequestItem.objects.filter(request__in=queryset)
+            .values('request_id')
+            .annotate(
+                line_count=models.Count('id'),
+                total_requested=models.Sum('quantity'),
+                total_issued=models.Sum('issued_quantity'),
+                total_returned=models.Sum('returned_quantity'),
+            )
+            .order_by()
+        )
+        totals = {}
+        for row in rows:
+            pk = row.pop('request_id')
+            row['outstanding'] = row['total_issued'] - row['total_returned']
+            totals[pk] = row
+        return totals
+
+    @classmethod
+    def refresh_totals(cls, queryset):
+        """Rewrites the counters of ``queryset`` that disagree with their items. Returns the fixed requests."""
+        empty = dict.fromkeys(cls.TOTAL_FIELDS, 0)
+        totals = cls.computed_totals(queryset)
+        stale = []
+        for req in queryset.only('pk', *cls.TOTAL_FIELDS):
+            expected = totals.get(req.pk, empty)
+            if any(getattr(req, field) != value for field, value in expected.items()):
+                for field, value in expected.items():
+                    setattr(req, field, value)
+                stale.append(req)
+        cls.objects.bulk_update(stale, cls.TOTAL_FIELDS, batch_size=1000)
+        return stale
+
 
 class RequestItem(models.Model):
     request = models.ForeignKey(Request, on_delete=models.CASCADE, related_name='items')
@@ -75,25 +209,302 @@ class RequestItem(models.Model):
     quantity = models.PositiveIntegerField() # Requested
     issued_quantity = models.PositiveIntegerField(default=0) # Given by incharge
     returned_quantity = models.PositiveIntegerField(default=0)
+    kit = models.ForeignKey(Kit, on_delete=models.SET_NULL, null=True, blank=True) # Set when expanded from a kit
 
     def __str__(self):
         return f"{self.component.name} (Issued: {self.issued_quantity}, Returned: {self.returned_quantity})"
+
+    # --- Keep Request's denormalized totals in step ---
+    # Bulk writes (bulk_create/update) bypass these; call Request.refresh_totals() after them.
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._counted = instance._counts()
+        return instance
+
+    def _counts(self):
+        # int(): form views assign raw POST strings before saving
+        return (int(self.quantity or 0), int(self.issued_quantity or 0), int(self.returned_quantity or 0))
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        old = (0, 0, 0) if adding else getattr(self, '_counted', None)
+        new = self._counts()
+        if old is not None and (adding or old != new):
+            Request.apply_totals_delta(
+                self.request_id,
+                lines=1 if adding else 0,
+                requested=new[0] - old[0],
+                issued=new[1] - old[1],
+                returned=new[2] - old[2],
+            )
+        self._counted = new
+
+    def delete(self, *args, **kwargs):
+        quantity, issued, returned = getattr(self, '_counted', self._counts())
+        request_id = self.request_id
+        result = super().delete(*args, **kwargs)
+        Request.apply_totals_delta(request_id, lines=-1, requested=-quantity, issued=-issued, returned=-returned)
+        return result
     
-# inventory/models.py
-from django.conf import settings
+class WaitlistEntry(models.Model):
+    """A student's demand for an out-of-stock component, served FIFO within priority."""
+    STATUS_CHOICES = (
+        ('waiting', 'Waiting'),
+        ('allocated', 'Allocated'),
+        ('cancelled', 'Cancelled'),
+    )
 
-class Student(models.Model):
-    # This links to your users_user table
-    user = models.OneToOneField(
-        settings.AUTH_USER_MODEL, 
-        on_delete=models.CASCADE, 
-        related_name='student_profile'
+    component = models.ForeignKey(Component, on_delete=models.CASCADE, related_name='waitlist')
+    student = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='waitlist_entries'
     )
-    # This is the "ID" you want to search by (e.g., Roll No)
-    student_id_code = models.CharField(max_length=20, unique=True)
+    quantity = models.PositiveIntegerField()
+    priority = models.IntegerField(default=0)  # Lower is served first
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='waiting')
+    requested_at = models.DateTimeField(auto_now_add=True)
+    allocated_at = models.DateTimeField(null=True, blank=True)
+    # The approved Request created when stock was allocated
+    request = models.ForeignKey(
+        Request,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='waitlist_entries'
+    )
+
+    class Meta:
+        verbose_name_plural = "Waitlist entries"
+        indexes = [
+            # The allocator's queue: only waiting rows, in service order
+            models.Index(
+                fields=['component', 'priority', 'requested_at'],
+                condition=models.Q(status='waiting'),
+                name='waitlist_queue_idx',
+            ),
+        ]
 
     def __str__(self):
-        return f"{self.student_id_code} - {self.user.first_name}"
+        return f"{self.quantity} x {self.component.name} for {self.student.username}"
+
+
+class StockAuditEntry(models.Model):
+    """Append-only record of every change to Component.available_quantity (see inventory/audit.py)."""
+    REASON_CHOICES = (
+        ('issue', 'Issued'),
+        ('return', 'Returned'),
+        ('waitlist_reserve', 'Reserved for waitlist'),
+        ('waitlist_release', 'Waitlist reservation released'),
+        ('stock_added', 'Stock added'),
+        ('admin_edit', 'Admin edit'),
+    )
+
+    component = models.ForeignKey(Component, on_delete=models.CASCADE, related_name='audit_entries')
+    delta = models.IntegerField()
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+    # Plain id, not a FK, so the trail survives archiving/deleting the request
+    request_ref = models.BigIntegerField(null=True, blank=True, db_index=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='stock_audit_entries'
+    )
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        verbose_name_plural = "Stock audit entries"
+        indexes = [
+            models.Index(fields=['component', 'created_at'], name='audit_component_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.component_id} {self.delta:+d} ({self.reason})"
+
+
+class StockLevelPoint(models.Model):
+    """Raw stock-level sample: available_quantity of a component right after a change (see stock_history.py)."""
+    component = models.ForeignKey(Component, on_delete=models.CASCADE, related_name='level_points')
+    at = models.DateTimeField(default=timezone.now)
+    level = models.IntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['component', 'at'], name='level_point_idx'),
+            models.Index(fields=['at'], name='level_point_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.component_id} @ {self.at:%Y-%m-%d %H:%M}: {self.level}"
+
+
+class StockLevelRollup(models.Model):
+    """Open/low/high/close of a component's level over one bucket; only buckets with changes get a row."""
+    component = models.ForeignKey(Component, on_delete=models.CASCADE, related_name='+')
+    bucket = models.DateTimeField()  # Start of the hour/day
+    open = models.IntegerField()
+    low = models.IntegerField()
+    high = models.IntegerField()
+    close = models.IntegerField()
+    samples = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return f"{self.component_id} @ {self.bucket:%Y-%m-%d %H:%M}: {self.close}"
+
+
+class StockLevelHourly(StockLevelRollup):
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['component', 'bucket'], name='unique_level_hour'),
+        ]
+
+
+class StockLevelDaily(StockLevelRollup):
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['component', 'bucket'], name='unique_level_day'),
+        ]
+
+
+class Job(models.Model):
+    """A unit of background work, run by `manage.py runworker` (see inventory/jobs.py)."""
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    )
+
+    name = models.CharField(max_length=100)  # Registered task name
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='jobs'
+    )
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    # File-like output (e.g. CSV exports), downloaded from /api/jobs/<id>/download/
+    output = models.TextField(blank=True)
+    output_name = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Refreshed by the worker while the job runs; a stale one means the worker died
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['run_after', 'id'], condition=models.Q(status='queued'), name='job_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"Job #{self.id} {self.name} ({self.status})"
+
+
+# --- ARCHIVE (cold storage for finished requests) ---
+# Rows keep their original ids so history links and exports stay stable.
+# Populated by `manage.py archive_requests`; read by request_history when needed.
+
+class ArchivedRequest(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    student = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='archived_requests'
+    )
+    status = models.CharField(max_length=20, choices=Request.STATUS_CHOICES)
+    approved_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='archived_approved_requests'
+    )
+    requested_at = models.DateTimeField(db_index=True)
+    collected_at = models.DateTimeField(null=True, blank=True)
+    return_deadline = models.DateField(null=True, blank=True)
+    return_date = models.DateTimeField(null=True, blank=True)
+    line_count = models.PositiveIntegerField(default=0)
+    total_requested = models.PositiveIntegerField(default=0)
+    total_issued = models.PositiveIntegerField(default=0)
+    total_returned = models.PositiveIntegerField(default=0)
+    outstanding = models.IntegerField(default=0)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    objects = RequestQuerySet.as_manager()
+
+    class Meta:
+        verbose_name_plural = "Archived requests"
+
+    def __str__(self):
+        return f"Archived request #{self.id}"
+
+
+class ArchivedRequestItem(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    request = models.ForeignKey(ArchivedRequest, on_delete=models.CASCADE, related_name='items')
+    component = models.ForeignKey(Component, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    issued_quantity = models.PositiveIntegerField(default=0)
+    returned_quantity = models.PositiveIntegerField(default=0)
+    kit = models.ForeignKey('Kit', on_delete=models.SET_NULL, null=True, blank=True)  # As on RequestItem
+
+    def __str__(self):
+        return f"{self.component_id} (Issued: {self.issued_quantity}, Returned: {self.returned_quantity})"
+
+# --- DEMAND FORECASTING (see inventory/forecasting.py) ---
+
+class ComponentDailyDemand(models.Model):
+    """Nightly rollup of RequestItem quantities per component per day."""
+    component = models.ForeignKey(Component, on_delete=models.CASCADE, related_name='daily_demand')
+    day = models.DateField(db_index=True)
+    requested = models.PositiveIntegerField(default=0)
+    issued = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['component', 'day'], name='unique_component_day_demand'),
+        ]
+
+    def __str__(self):
+        return f"{self.component_id} on {self.day}: {self.requested}"
+
+
+class RestockRecommendation(models.Model):
+    component = models.OneToOneField(
+        Component,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='restock'
+    )
+    avg_daily_7 = models.FloatField(default=0)
+    avg_daily_28 = models.FloatField(default=0)
+    semester_peak = models.FloatField(default=0)  # Highest avg daily demand in a same-half semester
+    outstanding = models.IntegerField(default=0)  # Issued and not yet returned
+    reorder_point = models.IntegerField(default=0)
+    suggested_order = models.IntegerField(default=0)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Restock {self.component_id}: order {self.suggested_order}"
+
+# inventory/models.py
+from django.conf import settings
 
 from django.db.models.signals import post_save
 from django.dispatch import receiver
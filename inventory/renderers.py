@@ -0,0 +1,77 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import msgpack
+except ImportError:  # Optional: only offered when msgpack is installed
+    msgpack = None
+
+
+# ==========================================
+# 📦 COMPACT (COLUMNAR) JSON
+# ==========================================
+# A list of objects like
+#   [{"id": 1, "status": "pending", "items": [{"component_name": "Arduino", ...}]}, ...]
+# is sent as a field list plus rows, so each key is written once per response:
+#   {"fields": ["id", "status", {"items": ["component_name", ...]}],
+#    "rows": [[1, "pending", [["Arduino", ...]]], ...]}
+# Nested lists of objects (request items) are compacted the same way.
+
+def _columns(rows):
+    columns = []
+    for name in rows[0]:
+        children = [child for row in rows if isinstance(row.get(name), list) for child in row[name]]
+        if children and all(isinstance(child, dict) for child in children):
+            columns.append((name, _columns(children)))
+        else:
+            columns.append((name, None))
+    return columns
+
+
+def _fields(columns):
+    return [{name: _fields(sub)} if sub else name for name, sub in columns]
+
+
+def _row(row, columns):
+    return [
+        [_row(child, sub) for child in row.get(name) or []] if sub else row.get(name)
+        for name, sub in columns
+    ]
+
+
+def compact(data):
+    """Converts a list of dicts (or a paginated {"results": [...]}) into fields + rows."""
+    if isinstance(data, dict) and isinstance(data.get('results'), list):
+        return {**data, 'results': compact(data['results'])}
+    if not isinstance(data, list) or not all(isinstance(row, dict) for row in data):
+        return data
+    if not data:
+        return {'fields': [], 'rows': []}
+    columns = _columns(data)
+    return {'fields': _fields(columns), 'rows': [_row(row, columns) for row in data]}
+
+
+class CompactJSONRenderer(JSONRenderer):
+    """Selected with `Accept: application/vnd.idealab.compact+json` or `?format=compact`."""
+    media_type = 'application/vnd.idealab.compact+json'
+    format = 'compact'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return super().render(compact(data), accepted_media_type, renderer_context)
+
+
+# ==========================================
+# 📦 MESSAGEPACK
+# ==========================================
+
+class MessagePackRenderer(BaseRenderer):
+    """Selected with `Accept: application/msgpack` or `?format=msgpack`."""
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=str)
+
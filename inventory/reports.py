@@ -0,0 +1,179 @@
+"""
+Semester-end utilization reports.
+
+``build_reports`` splits the students who made requests in the window into
+contiguous user-id ranges and aggregates each range in a separate process
+(``ProcessPoolExecutor``, one DB connection per worker). Each shard streams
+grouped rows with ``.iterator()`` from the live and archive tables and returns
+plain tuples; the parent merges them into per-student and per-component rows
+and writes CSV (and XLSX when openpyxl is installed).
+"""
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time
+
+from django.db import connections
+from django.db.models import Count, F, Max, Min, Q, Sum
+from django.utils import timezone
+
+from .models import ArchivedRequestItem, Category, Component, RequestItem
+from .routers import read_replica
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+STUDENT_COLUMNS = [
+    'Roll No', 'Username', 'Name', 'Requests', 'Requested', 'Issued', 'Returned', 'Unreturned', 'Overdue Requests',
+]
+COMPONENT_COLUMNS = ['Component', 'Category', 'Requests', 'Requested', 'Issued', 'Returned', 'Unreturned']
+
+# Per-shard aggregates; rows carry no ORM objects so they pickle cheaply
+_TOTALS = {
+    'requested': Sum('quantity'),
+    'issued': Sum('issued_quantity'),
+    'returned': Sum('returned_quantity'),
+}
+
+
+def _window(queryset, since, until):
+    if since:
+        queryset = queryset.filter(request__requested_at__gte=datetime.combine(since, time.min))
+    if until:
+        queryset = queryset.filter(request__requested_at__lte=datetime.combine(until, time.max))
+    return queryset
+
+
+@read_replica()
+def student_shard(lo, hi, since=None, until=None, today=None):
+    """
+    Aggregates students with user id in [lo, hi]. Returns (students, components):
+    ``students`` maps user id -> [roll, username, name, requests, requested, issued, returned, overdue],
+    ``components`` maps component id -> [requests, requested, issued, returned].
+    """
+    today = today or timezone.now().date()
+    students, components = {}, {}
+    overdue = Q(request__status='collected', request__return_deadline__lt=today)
+
+    for model in (RequestItem, ArchivedRequestItem):
+        items = _window(model.objects.filter(request__student__id__range=(lo, hi)), since, until).order_by()
+
+        per_student = items.values(
+            'request__student_id',
+            username=F('request__student__username'),
+            first_name=F('request__student__first_name'),
+            last_name=F('request__student__last_name'),
+            roll=F('request__student__roll_number'),
+        ).annotate(
+            requests=Count('request', distinct=True),
+            overdue=Count('request', filter=overdue, distinct=True),
+            **_TOTALS,
+        )
+        for row in per_student.iterator(chunk_size=2000):
+            entry = students.setdefault(row['request__student_id'], [
+                row['roll'] or '', row['username'], f"{row['first_name']} {row['last_name']}".strip(), 0, 0, 0, 0, 0,
+            ])
+            for i, key in enumerate(('requests', 'requested', 'issued', 'returned', 'overdue'), start=3):
+                entry[i] += row[key] or 0
+
+        per_component = items.values('component_id').annotate(requests=Count('request', distinct=True), **_TOTALS)
+        for row in per_component.iterator(chunk_size=2000):
+            entry = components.setdefault(row['component_id'], [0, 0, 0, 0])
+            for i, key in enumerate(('requests', 'requested', 'issued', 'returned')):
+                entry[i] += row[key] or 0
+
+    return students, components
+
+
+def student_ranges(shards, since=None, until=None):
+    """Splits the user ids of students with requests in the window into ``shards`` contiguous ranges."""
+    bounds = _window(RequestItem.objects.all(), since, until).aggregate(
+        lo=Min('request__student_id'), hi=Max('request__student_id'),
+    )
+    archived = _window(ArchivedRequestItem.objects.all(), since, until).aggregate(
+        lo=Min('request__student_id'), hi=Max('request__student_id'),
+    )
+    lows = [v for v in (bounds['lo'], archived['lo']) if v is not None]
+    highs = [v for v in (bounds['hi'], archived['hi']) if v is not None]
+    if not lows:
+        return []
+    lo, hi = min(lows), max(highs)
+    step = max((hi - lo + 1) // max(shards, 1), 1)
+    ranges = []
+    start = lo
+    while start <= hi:
+        end = hi if len(ranges) == shards - 1 else min(start + step - 1, hi)
+        ranges.append((start, end))
+        start = end + 1
+    return ranges
+
+
+def _init_worker():
+    # Forked workers must not share the parent's connection; each opens its own
+    import django
+    django.setup()
+    connections.close_all()
+
+
+@read_replica()
+def build_reports(since=None, until=None, workers=None, shards=None, today=None):
+    """Returns (student_rows, component_rows) ready to write, computed over ``workers`` processes."""
+    workers = workers or os.cpu_count() or 1
+    ranges = student_ranges(shards or workers * 4, since, until)
+    args = [(lo, hi, since, until, today) for lo, hi in ranges]
+
+    if workers <= 1 or len(ranges) <= 1:
+        results = [student_shard(*a) for a in args]
+    else:
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            results = list(pool.map(student_shard, *zip(*args)))
+
+    students, components = {}, {}
+    for shard_students, shard_components in results:
+        # Ranges don't overlap, so students never need merging
+        students.update(shard_students)
+        for pk, totals in shard_components.items():
+            merged = components.setdefault(pk, [0, 0, 0, 0])
+            for i, value in enumerate(totals):
+                merged[i] += value
+
+    student_rows = []
+    for roll, username, name, requests, requested, issued, returned, overdue in students.values():
+        student_rows.append([roll, username, name, requests, requested, issued, returned, issued - returned, overdue])
+    student_rows.sort(key=lambda row: (row[0], row[1]))
+
+    names = {c.pk: c for c in Component.objects.for_listing().filter(pk__in=components)}
+    categories = dict(Category.objects.values_list('id', 'name'))
+    component_rows = []
+    for pk, (requests, requested, issued, returned) in components.items():
+        component = names.get(pk)
+        component_rows.append([
+            component.name if component else f'#{pk}',
+            categories.get(component.category_id, '') if component else '',
+            requests, requested, issued, returned, issued - returned,
+        ])
+    component_rows.sort(key=lambda row: row[0])
+    return student_rows, component_rows
+
+
+def write_csv(path, columns, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        writer.writerows(rows)
+
+
+def write_xlsx(path, sheets):
+    """``sheets`` is a list of (title, columns, rows). Needs openpyxl."""
+    if openpyxl is None:
+        raise RuntimeError("XLSX output needs openpyxl (pip install openpyxl)")
+    workbook = openpyxl.Workbook(write_only=True)
+    for title, columns, rows in sheets:
+        sheet = workbook.create_sheet(title)
+        sheet.append(columns)
+        for row in rows:
+            sheet.append(row)
+    workbook.save(path)
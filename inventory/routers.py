@@ -0,0 +1,120 @@
+"""
+Read-replica routing.
+
+Reads go to the primary ('default') unless code opts in with ``read_replica``
+(a decorator or context manager) — list/history polls, the audit and restock
+views and the report generator do. Code inside it must be read-only apart from
+locked reads: select_for_update() always goes to the primary. Reads pick a
+random alias from settings.DATABASE_REPLICAS, except:
+
+* once the current request has written anything,
+* for REPLICA_PIN_SECONDS after a client's last write (read-your-writes): the
+  middleware pins the client, identified by its API token or session cookie.
+
+Writes always go to the primary. With no replicas configured everything stays on
+'default', so the router is safe to leave installed everywhere.
+"""
+import contextvars
+import hashlib
+import random
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+
+_use_replica = contextvars.ContextVar('use_replica', default=False)
+_client = contextvars.ContextVar('replica_client', default=None)
+
+PIN_PREFIX = 'replica-pin:'
+
+
+def replica_aliases():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def pin_seconds():
+    return getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+
+
+@contextmanager
+def read_replica():
+    """
+    Lets reads in the wrapped view/block go to a replica (when stickiness allows).
+    A generator, so each call/decorated invocation keeps its own reset token: one
+    instance shared by concurrent threads would reset another thread's token.
+    """
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+class _ClientState:
+    __slots__ = ('key', 'pinned', 'wrote')
+
+    def __init__(self, key, pinned):
+        self.key = key
+        self.pinned = pinned
+        self.wrote = False
+
+
+def pinned_to_primary():
+    """True while the current request must see its client's own writes (it reads from 'default')."""
+    client = _client.get()
+    return client is not None and (client.pinned or client.wrote)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not _use_replica.get():
+            return None
+        if pinned_to_primary():
+            return 'default'
+        replicas = replica_aliases()
+        return random.choice(replicas) if replicas else None
+
+    def db_for_write(self, model, **hints):
+        client = _client.get()
+        if client is not None:
+            client.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
+
+
+def client_key(request):
+    """Identifies the API token or browser session the request belongs to (None for anonymous)."""
+    credential = request.META.get('HTTP_AUTHORIZATION') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not credential:
+        return None
+    return PIN_PREFIX + hashlib.sha1(credential.encode()).hexdigest()
+
+
+class ReplicaPinMiddleware:
+    """Pins a client to the primary for REPLICA_PIN_SECONDS after any request of theirs writes."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not replica_aliases():
+            return self.get_response(request)
+
+        key = client_key(request)
+        # Unsafe methods never read from a replica: they usually read-modify-write
+        pinned = request.method not in ('GET', 'HEAD', 'OPTIONS') or (key is not None and bool(cache.get(key)))
+        state = _ClientState(key, pinned)
+        token = _client.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _client.reset(token)
+        if state.wrote and key is not None:
+            cache.set(key, 1, pin_seconds())
+        return response
@@ -0,0 +1,228 @@
+"""
+Counter scanning: issue and return parts from a stream of barcode/QR scans.
+
+A scan is ``{"code": ..., "component": ..., "qty": 1}`` where ``code`` is a student's
+roll number / ID-card QR payload or a request (``R123``, ``#123`` or ``123``; a code
+that is also a roll number means the student), and ``component`` is a component
+label code, its id or its exact name. The app
+buffers scans for a moment and posts them as one micro-batch; ``apply_scans``
+applies the whole batch in a fixed number of queries however many scans it holds:
+one indexed query resolves every component code, one locks the affected request
+lines, and all writes are bulk updates plus a single audit insert.
+
+Bad scans (unknown code, nothing left to issue/return) are reported per scan and
+don't block the rest of the batch.
+"""
+import re
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .audit import record
+from .models import Component, Request, RequestItem, WaitlistEntry
+from .students import OPEN_STATUSES, existing_roll_numbers, scanned_roll_numbers
+from .waitlist import allocate_waitlist
+
+ACTIONS = ('issue', 'return')
+MAX_SCANS_PER_BATCH = 500
+REQUEST_CODE = re.compile(r'^(?:R|REQ-?|#)?(\d+)$', re.IGNORECASE)
+
+
+class ScanError(Exception):
+    pass
+
+
+def parse_request_code(code):
+    """
+    (candidate roll numbers, request id or None) for a scanned code; ``resolve_codes``
+    decides which one it is.
+    """
+    code = str(code or '').strip()
+    candidates = scanned_roll_numbers(code)
+    if not candidates:
+        raise ScanError("Missing request/student code")
+    match = REQUEST_CODE.match(code)
+    return tuple(candidates), int(match.group(1)) if match else None
+
+
+def resolve_codes(codes):
+    """
+    {parsed code: ('student', roll number) | ('request', id) | None} for ``parse_request_code``
+    results, with one roll-number query. Roll numbers win: ``123`` or ``R123`` is a request
+    only when no student has that roll number.
+    """
+    students = existing_roll_numbers({candidates for candidates, _ in codes})
+    resolved = {}
+    for candidates, request_id in codes:
+        if students[candidates] is not None:
+            resolved[candidates, request_id] = ('student', students[candidates])
+        elif request_id is not None:
+            resolved[candidates, request_id] = ('request', request_id)
+        else:
+            resolved[candidates, request_id] = None
+    return resolved
+
+
+def component_code_map(codes):
+    """{scanned code: component id} for every code that matches a label code, an id or an exact name."""
+    codes = {str(code).strip() for code in codes if str(code or '').strip()}
+    if not codes:
+        return {}
+    ids = {int(code) for code in codes if code.isdigit()}
+    rows = Component.objects.filter(Q(code__in=codes) | Q(pk__in=ids) | Q(name__in=codes)).values_list('id', 'code', 'name')
+    by_code, by_id, by_name = {}, set(), {}
+    for pk, label, name in rows:
+        if label:
+            by_code[label] = pk
+        by_id.add(pk)
+        by_name.setdefault(name, pk)
+    resolved = {}
+    for code in codes:
+        if code in by_code:
+            resolved[code] = by_code[code]
+        elif code.isdigit() and int(code) in by_id:
+            resolved[code] = int(code)
+        elif code in by_name:
+            resolved[code] = by_name[code]
+    return resolved
+
+
+def _quantity(scan):
+    try:
+        qty = int(scan.get('qty', 1))
+    except (TypeError, ValueError):
+        raise ScanError("Quantity must be a number")
+    if qty <= 0:
+        raise ScanError("Quantity must be positive")
+    return qty
+
+
+@transaction.atomic
+def apply_scans(scans, action=None):
+    """
+    Applies a micro-batch of scans in one transaction. ``action`` is the default for scans
+    without their own ``"action"``. Returns (results, touched request ids), with one result
+    dict per scan, in order.
+    """
+    parsed = []
+    for scan in scans:
+        try:
+            if not isinstance(scan, dict):
+                raise ScanError("Each scan must be an object")
+            scan_action = scan.get('action', action)
+            if scan_action not in ACTIONS:
+                raise ScanError(f"Action must be one of {', '.join(ACTIONS)}")
+            parsed.append((scan_action, parse_request_code(scan.get('code')), str(scan.get('component') or '').strip(), _quantity(scan)))
+        except ScanError as exc:
+            parsed.append(exc)
+
+    components = component_code_map(p[2] for p in parsed if not isinstance(p, ScanError))
+    targets = resolve_codes({p[1] for p in parsed if not isinstance(p, ScanError)})
+    request_ids = {key for kind, key in filter(None, targets.values()) if kind == 'request'}
+    roll_numbers = {key for kind, key in filter(None, targets.values()) if kind == 'student'}
+
+    # Every line of every open request the batch can touch, locked for the batch
+    lines = list(
+        RequestItem.objects.select_for_update(of=('self',))
+        .filter(Q(request_id__in=request_ids) | Q(request__student__roll_number__in=roll_numbers))
+        .filter(request__status__in=OPEN_STATUSES)
+        .select_related('request', 'request__student')
+        .only('id', 'request', 'component_id', 'quantity', 'issued_quantity', 'returned_quantity',
+              'request__status', 'request__requested_at', 'request__collected_at', 'request__return_date',
+              'request__student', 'request__student__roll_number')
+        .order_by('request__requested_at', 'id')
+    )
+    reserved = set(
+        WaitlistEntry.objects.filter(request_id__in={line.request_id for line in lines}).values_list('request_id', flat=True)
+    )
+    stock = {
+        c.pk: c for c in Component.objects.select_for_update()
+        .filter(pk__in={line.component_id for line in lines}).order_by('pk').only('id', 'available_quantity', 'total_quantity')
+    }
+
+    # In-memory code map: each scan finds its candidate lines with one dict lookup
+    candidates = {}
+    for line in lines:
+        candidates.setdefault(('request', line.request_id, line.component_id), []).append(line)
+        candidates.setdefault(('student', line.request.student.roll_number, line.component_id), []).append(line)
+
+    now = timezone.now()
+    results = []
+    changed_lines, changed_requests, returned_requests = {}, {}, set()
+
+    for index, item in enumerate(parsed):
+        if isinstance(item, ScanError):
+            results.append({'index': index, 'ok': False, 'error': str(item)})
+            continue
+        scan_action, code, component_code, qty = item
+        if targets[code] is None:
+            results.append({'index': index, 'ok': False, 'error': "No student or request with that code"})
+            continue
+        kind, key = targets[code]
+        component_id = components.get(component_code)
+        if component_id is None:
+            results.append({'index': index, 'ok': False, 'error': f"Unknown component code {component_code!r}"})
+            continue
+
+        matches = candidates.get((kind, key, component_id), [])
+        if scan_action == 'issue':
+            line = next((l for l in matches if l.quantity - l.issued_quantity >= qty), None)
+            if line is None:
+                results.append({'index': index, 'ok': False, 'error': "Nothing left to issue for this component"})
+                continue
+            # Waitlist requests took their units out of stock when they were allocated
+            delta = 0 if line.request_id in reserved else -qty
+            if stock[component_id].available_quantity + delta < 0:
+                results.append({'index': index, 'ok': False, 'error': "Not enough stock"})
+                continue
+            line.issued_quantity += qty
+            if line.request.status != 'collected':
+                line.request.status = 'collected'
+                line.request.collected_at = now
+                changed_requests[line.request_id] = line.request
+        else:
+            line = next((
+                l for l in matches
+                if l.request.status == 'collected' and l.issued_quantity - l.returned_quantity >= qty
+            ), None)
+            if line is None:
+                results.append({'index': index, 'ok': False, 'error': "Nothing outstanding to return for this component"})
+                continue
+            line.returned_quantity += qty
+            component = stock[component_id]
+            delta = min(qty, component.total_quantity - component.available_quantity)
+            returned_requests.add(line.request_id)
+
+        stock[component_id].available_quantity += delta
+        record(component_id, delta, scan_action, line.request_id)
+        changed_lines[line.pk] = line
+        results.append({
+            'index': index, 'ok': True, 'request': line.request_id, 'component': component_id,
+            'issued_quantity': line.issued_quantity, 'returned_quantity': line.returned_quantity,
+        })
+
+    if not changed_lines:
+        return results, []
+
+    touched = {line.request_id for line in changed_lines.values()}
+    by_request = {}
+    for line in lines:
+        by_request.setdefault(line.request_id, []).append(line)
+    for pk in returned_requests:
+        req = by_request[pk][0].request
+        if req.status == 'collected' and all(l.returned_quantity >= l.issued_quantity for l in by_request[pk]):
+            req.status = 'returned'
+            req.return_date = now
+            changed_requests[pk] = req
+
+    RequestItem.objects.bulk_update(changed_lines.values(), ['issued_quantity', 'returned_quantity'])
+    Component.objects.bulk_update([stock[pk] for pk in {l.component_id for l in changed_lines.values()}], ['available_quantity'])
+    if changed_requests:
+        Request.objects.bulk_update(changed_requests.values(), ['status', 'collected_at', 'return_date'])
+    # bulk_update skips RequestItem.save(), so bring the denormalized totals back in step
+    Request.refresh_totals(Request.objects.filter(pk__in=touched))
+    if returned_requests:
+        # Returned units go to students waiting for them first
+        allocate_waitlist({l.component_id for l in changed_lines.values() if l.request_id in returned_requests})
+    return results, sorted(touched)
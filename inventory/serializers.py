@@ -6,16 +6,30 @@ class RequestItemSerializer(serializers.ModelSerializer):
     
     # This grabs the 'name' from the related Component model
     #item_name = serializers.ReadOnlyField(source='component.name') 
-    component_name = serializers.ReadOnlyField(source='component.name')
-    category_name = serializers.ReadOnlyField(source='component.category.name')
+    component_name = serializers.SerializerMethodField()
+    category_name = serializers.SerializerMethodField()
 
     class Meta:
         model = RequestItem
         # Add 'item_name' to the fields list
-        fields = ['id', 'component', 'component_name', 'category_name', 'quantity', 'issued_quantity', 'returned_quantity',]
+        fields = ['id', 'component', 'component_name', 'category_name', 'quantity', 'issued_quantity', 'returned_quantity', 'kit']
+
+    # Resolve names through the response-wide LookupCache when the view provides one,
+    # otherwise fall back to walking the relations.
+    def get_component_name(self, obj):
+        lookups = self.context.get('lookups')
+        if lookups is not None:
+            return lookups.component_name(obj.component_id)
+        return obj.component.name
+
+    def get_category_name(self, obj):
+        lookups = self.context.get('lookups')
+        if lookups is not None:
+            return lookups.category_name(obj.component_id)
+        return obj.component.category.name
 
 class ItemRequestSerializer(serializers.ModelSerializer):
-    student_id = serializers.ReadOnlyField(source='student.student_profile.student_id_code')
+    student_id = serializers.ReadOnlyField(source='student.roll_number')
     items = RequestItemSerializer(many=True, read_only=True)
     student_name = serializers.CharField(source='student.first_name', read_only=True)
 
@@ -30,7 +44,12 @@ class ItemRequestSerializer(serializers.ModelSerializer):
             'items', 
             'requested_at', 
             'collected_at', 
-            'return_date'
+            'return_date',
+            'line_count',
+            'total_requested',
+            'total_issued',
+            'total_returned',
+            'outstanding',
         ]
 
 from .models import Component as Item  # Ensure you import your Item model
@@ -43,6 +62,7 @@ from .models import  Request
 
 from rest_framework import serializers
 from .models import Component, Category # Ensure these are imported
+from .models import Kit, KitComponent
 
 class ItemSerializer(serializers.ModelSerializer):
     # 1. Define custom fields
@@ -59,7 +79,8 @@ class ItemSerializer(serializers.ModelSerializer):
             'category', 
             'category_name', 
             'total_quantity', 
-            'available_quantity'
+            'available_quantity',
+            'code',
         ]
 
     # 3. Dynamic initialization to prevent the "ID 5 not found" error
@@ -81,4 +102,21 @@ class HistorySerializer(serializers.ModelSerializer):
         fields = [
             'id', 'student_name', 'student_id', 'status', 'items',
             'requested_at', 'collected_at', 'returned_at' 
-        ]
\ No newline at end of file
+        ]
+
+class KitComponentSerializer(serializers.ModelSerializer):
+    component_name = serializers.CharField(source='component.name', read_only=True)
+
+    class Meta:
+        model = KitComponent
+        fields = ['component', 'component_name', 'quantity']
+
+
+class KitSerializer(serializers.ModelSerializer):
+    lines = KitComponentSerializer(many=True, read_only=True)
+    # Annotated by kits_with_availability()
+    available_kits = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Kit
+        fields = ['id', 'name', 'description', 'lines', 'available_kits']
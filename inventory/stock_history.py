@@ -0,0 +1,174 @@
+"""
+Stock-level time series for trend charts.
+
+Every audited stock change also leaves a StockLevelPoint with the component's
+level after the change: ``AuditBatch.flush`` calls ``record_levels`` for the
+components it touched, so the issue/return/scan/admin/item-POST paths all feed
+it with one extra SELECT + INSERT per operation.
+
+``manage.py rollup_stock_history`` (run hourly) folds raw points into
+StockLevelHourly and hourly rows into StockLevelDaily (open/low/high/close per
+bucket, only for buckets with changes), then prunes each table past its
+retention (settings.STOCK_HISTORY_RETENTION, days; None keeps forever).
+
+``trend`` answers a range from the finest table that both still covers it and
+returns at most MAX_TREND_POINTS rows, so a year-long chart reads a few hundred
+daily rows.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Component, StockLevelDaily, StockLevelHourly, StockLevelPoint
+
+MAX_TREND_POINTS = 500
+DEFAULT_RETENTION = {'raw': 14, 'hour': 180, 'day': None}
+
+
+def retention_days(resolution):
+    return {**DEFAULT_RETENTION, **getattr(settings, 'STOCK_HISTORY_RETENTION', {})}[resolution]
+
+
+def record_levels(component_ids, at=None):
+    """Appends a raw point with the current level of each component."""
+    if not component_ids:
+        return
+    at = at or timezone.now()
+    StockLevelPoint.objects.bulk_create([
+        StockLevelPoint(component_id=pk, at=at, level=level)
+        for pk, level in Component.objects.filter(pk__in=set(component_ids)).values_list('id', 'available_quantity')
+    ])
+
+
+# --- ROLLUPS ---
+
+def _truncate(moment, resolution):
+    moment = moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0) if resolution == 'day' else moment
+
+
+def _fold(samples, resolution):
+    """
+    Groups (component_id, time, open, low, high, close, samples) tuples, ordered by
+    component then time, into one row per (component, bucket).
+    """
+    current = None
+    for component_id, at, open_, low, high, close, count in samples:
+        key = (component_id, _truncate(at, resolution))
+        if current is None or current[0] != key:
+            if current is not None:
+                yield current
+            current = [key, open_, low, high, close, count]
+        else:
+            current[2] = min(current[2], low)
+            current[3] = max(current[3], high)
+            current[4] = close
+            current[5] += count
+    if current is not None:
+        yield current
+
+
+def _rollup(model, resolution, samples, batch_size=1000):
+    rows = []
+    written = 0
+    for (component_id, bucket), open_, low, high, close, count in _fold(samples, resolution):
+        rows.append(model(
+            component_id=component_id, bucket=bucket, open=open_, low=low, high=high, close=close, samples=count,
+        ))
+        if len(rows) >= batch_size:
+            written += _upsert(model, rows)
+            rows = []
+    return written + _upsert(model, rows)
+
+
+def _upsert(model, rows):
+    model.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['component', 'bucket'],
+        update_fields=['open', 'low', 'high', 'close', 'samples'],
+    )
+    return len(rows)
+
+
+def rollup_hourly(full=False):
+    """Upserts hourly rows from raw points, recomputing from the last rolled-up hour. Returns rows written."""
+    since = None if full else StockLevelHourly.objects.aggregate(last=Max('bucket'))['last']
+    points = StockLevelPoint.objects.order_by('component_id', 'at', 'id')
+    if since:
+        points = points.filter(at__gte=since)
+    samples = (
+        (pk, at, level, level, level, level, 1)
+        for pk, at, level in points.values_list('component_id', 'at', 'level').iterator(chunk_size=5000)
+    )
+    return _rollup(StockLevelHourly, 'hour', samples)
+
+
+def rollup_daily(full=False):
+    """Upserts daily rows from hourly ones, recomputing from the last rolled-up day. Returns rows written."""
+    since = None if full else StockLevelDaily.objects.aggregate(last=Max('bucket'))['last']
+    hours = StockLevelHourly.objects.order_by('component_id', 'bucket')
+    if since:
+        hours = hours.filter(bucket__gte=since)
+    samples = hours.values_list('component_id', 'bucket', 'open', 'low', 'high', 'close', 'samples').iterator(chunk_size=5000)
+    return _rollup(StockLevelDaily, 'day', samples)
+
+
+def prune(now=None):
+    """Deletes rows past their retention. Returns {resolution: rows deleted}."""
+    now = now or timezone.now()
+    deleted = {}
+    for resolution, model, field in (
+        ('raw', StockLevelPoint, 'at'), ('hour', StockLevelHourly, 'bucket'), ('day', StockLevelDaily, 'bucket'),
+    ):
+        days = retention_days(resolution)
+        if days is None:
+            continue
+        deleted[resolution], _ = model.objects.filter(**{f'{field}__lt': now - timedelta(days=days)}).delete()
+    return deleted
+
+
+# --- TRENDS ---
+
+def pick_resolution(component_id, start, end, now=None):
+    """Finest of raw/hour/day that covers ``start`` and has at most MAX_TREND_POINTS rows in the range."""
+    now = now or timezone.now()
+
+    def covers(resolution):
+        days = retention_days(resolution)
+        return days is None or start >= now - timedelta(days=days)
+
+    if covers('raw'):
+        raw_count = StockLevelPoint.objects.filter(component_id=component_id, at__gte=start, at__lte=end)[:MAX_TREND_POINTS + 1].count()
+        if raw_count <= MAX_TREND_POINTS:
+            return 'raw'
+    # Rollups only have rows for buckets with changes, so the span is an upper bound
+    if covers('hour') and (end - start) <= timedelta(hours=MAX_TREND_POINTS):
+        return 'hour'
+    return 'day'
+
+
+def trend(component_id, start, end, resolution=None):
+    """
+    The level series of a component over [start, end] as a dict with ``resolution``,
+    ``start_level`` (level going into the range) and ``points``. Raw points are
+    {'t', 'level'}; rollups are {'t', 'open', 'low', 'high', 'close'}.
+    """
+    resolution = resolution or pick_resolution(component_id, start, end)
+    if resolution == 'raw':
+        rows = StockLevelPoint.objects.filter(component_id=component_id, at__gte=start, at__lte=end).order_by('at', 'id')
+        points = [{'t': at, 'level': level} for at, level in rows.values_list('at', 'level')]
+        before = StockLevelPoint.objects.filter(component_id=component_id, at__lt=start).order_by('-at', '-id')
+        start_level = before.values_list('level', flat=True).first()
+    else:
+        model = StockLevelHourly if resolution == 'hour' else StockLevelDaily
+        rows = model.objects.filter(component_id=component_id, bucket__gte=_truncate(start, resolution), bucket__lte=end)
+        points = [
+            {'t': bucket, 'open': open_, 'low': low, 'high': high, 'close': close}
+            for bucket, open_, low, high, close in rows.order_by('bucket').values_list('bucket', 'open', 'low', 'high', 'close')
+        ]
+        before = model.objects.filter(component_id=component_id, bucket__lt=_truncate(start, resolution)).order_by('-bucket')
+        start_level = before.values_list('close', flat=True).first()
+    return {'resolution': resolution, 'start_level': start_level, 'points': points}
@@ -0,0 +1,102 @@
+from django.contrib.auth import get_user_model
+from django.db.models import F, FilteredRelation, Q
+
+from users.models import normalize_roll_number
+
+# Requests an incharge can still act on at the counter
+OPEN_STATUSES = ('pending', 'approved', 'collected')
+
+_ROW_FIELDS = {
+    'request_id': 'open_requests__id',
+    'status': 'open_requests__status',
+    'requested_at': 'open_requests__requested_at',
+    'return_deadline': 'open_requests__return_deadline',
+    'outstanding': 'open_requests__outstanding',
+    'item_id': 'open_requests__items__id',
+    'component': 'open_requests__items__component_id',
+    'component_name': 'open_requests__items__component__name',
+    'quantity': 'open_requests__items__quantity',
+    'issued_quantity': 'open_requests__items__issued_quantity',
+    'returned_quantity': 'open_requests__items__returned_quantity',
+}
+
+
+def scanned_roll_numbers(code):
+    """
+    Roll numbers a typed or scanned code may stand for, most literal first: the code
+    itself, then the tail of an ID-card QR payload (``IDEALAB:MEC21CS001`` or a URL
+    ending in the roll number). Callers prefer the first one that exists.
+    """
+    roll_number = normalize_roll_number(code)
+    if roll_number is None:
+        return []
+    tail = normalize_roll_number(roll_number.rstrip('/').rsplit('/', 1)[-1].rsplit(':', 1)[-1])
+    return [roll_number] if tail in (None, roll_number) else [roll_number, tail]
+
+
+def existing_roll_numbers(candidates):
+    """Maps each tuple of ``scanned_roll_numbers`` to its first existing student's roll number (one query)."""
+    wanted = {roll_number for options in candidates for roll_number in options}
+    found = set(
+        get_user_model().objects.filter(roll_number__in=wanted, role='student').values_list('roll_number', flat=True)
+    ) if wanted else set()
+    return {options: next((r for r in options if r in found), None) for options in candidates}
+
+
+def resolve_student(code):
+    """
+    Resolves a typed or scanned roll number to the student and their open requests with items.
+
+    One query: the roll_number unique index finds the user and a LEFT JOIN restricted to
+    OPEN_STATUSES brings the requests/items along, so a student with nothing open still
+    resolves. Returns None for an unknown code, else
+    ``{'id', 'username', 'name', 'roll_number', 'loans': [{..., 'items': [...]}]}``.
+    """
+    candidates = scanned_roll_numbers(code)
+    if not candidates:
+        return None
+    rows = list(
+        get_user_model().objects.filter(roll_number__in=candidates, role='student')
+        .annotate(open_requests=FilteredRelation('requests', condition=Q(requests__status__in=OPEN_STATUSES)))
+        .order_by('open_requests__requested_at', 'open_requests__items__id')
+        .values('id', 'username', 'first_name', 'last_name', 'roll_number', **{key: F(path) for key, path in _ROW_FIELDS.items()})
+    )
+    if not rows:
+        return None
+    # Both the literal code and a payload tail may exist: the literal one wins
+    best = min({row['roll_number'] for row in rows}, key=candidates.index)
+    rows = [row for row in rows if row['roll_number'] == best]
+
+    first = rows[0]
+    student = {
+        'id': first['id'],
+        'username': first['username'],
+        'name': f"{first['first_name']} {first['last_name']}".strip(),
+        'roll_number': first['roll_number'],
+        'loans': [],
+    }
+    loans = {}
+    for row in rows:
+        if row['request_id'] is None:
+            continue
+        loan = loans.get(row['request_id'])
+        if loan is None:
+            loan = loans[row['request_id']] = {
+                'id': row['request_id'],
+                'status': row['status'],
+                'requested_at': row['requested_at'],
+                'return_deadline': row['return_deadline'],
+                'outstanding': row['outstanding'],
+                'items': [],
+            }
+            student['loans'].append(loan)
+        if row['item_id'] is not None:
+            loan['items'].append({
+                'id': row['item_id'],
+                'component': row['component'],
+                'component_name': row['component_name'],
+                'quantity': row['quantity'],
+                'issued_quantity': row['issued_quantity'],
+                'returned_quantity': row['returned_quantity'],
+            })
+    return student
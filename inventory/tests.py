@@ -1,3 +1,1228 @@
-from django.test import TestCase
+import csv
+import gzip
+import importlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.models import F
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from users.models import User
+from .admin import RequestAdmin
+from .archive import archive_finished_requests, history_needs_archive
+from .audit import audit_batch, record
+from .authentication import CACHE_PREFIX
+from .coalescing import GENERATION_KEY, invalidate_coalesced
+from .forecasting import compute_recommendations, rollup_daily_demand
+from .jobs import TASKS, claim_job, enqueue, reclaim_stale_jobs, run_pending_jobs, task
+from .kits import kits_with_availability
+from .lookups import LookupCache
+from .middleware import APICompressionMiddleware
+from .models import (
+    ArchivedRequestItem, Category, Component, ComponentDailyDemand, Job, Kit, KitComponent, Request, RequestItem,
+    RestockRecommendation, StockAuditEntry, StockLevelDaily, StockLevelHourly, StockLevelPoint, WaitlistEntry,
+)
+from .renderers import CompactJSONRenderer, MessagePackRenderer, compact
+from .reports import build_reports, student_ranges
+from .routers import client_key, read_replica
+from .serializers import ItemRequestSerializer, ItemSerializer
+from .stock_history import prune, rollup_daily, rollup_hourly
+from .throttling import RequestListThrottle
+from .views import get_categories
+from .waitlist import allocate_waitlist
+
+
+@contextmanager
+def time_budget(testcase, seconds):
+    """Fails the test if the block takes longer than ``seconds`` (wall clock)."""
+    start = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - start
+    testcase.assertLess(elapsed, seconds, f"took {elapsed:.3f}s, budget {seconds}s")
+
+
+class ApiTestCase(TestCase):
+    """Shared fixture: an incharge, a student with a roll number, stock and some requests."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.incharge = User.objects.create_user('incharge', password='pw', is_staff=True, role='incharge')
+        cls.student = User.objects.create_user(
+            'stu@college.edu', password='pw', first_name='Anu', last_name='K', role='student', roll_number='MEC21CS001',
+        )
+        cls.boards = Category.objects.create(name='Boards')
+        cls.sensors = Category.objects.create(name='Sensors')
+        cls.arduino = Component.objects.create(name='Arduino', category=cls.boards, total_quantity=10, available_quantity=10)
+        cls.dht11 = Component.objects.create(name='DHT11', category=cls.sensors, total_quantity=20, available_quantity=20)
+        cls.token = Token.objects.create(user=cls.incharge)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    # Classmethods so subclasses can also build their data in setUpTestData
+    @classmethod
+    def make_request(cls, student=None, items=((None, 1),), status='pending'):
+        req = Request.objects.create(student=student or cls.student, status=status)
+        for component, qty in items:
+            RequestItem.objects.create(request=req, component=component or cls.arduino, quantity=qty)
+        return req
+
+    @classmethod
+    def make_many(cls, count):
+        for n in range(count):
+            cls.make_request(items=((cls.arduino, 1), (cls.dht11, 2)))
+
+    @classmethod
+    def set_stock(cls, component, available, total=None):
+        Component.objects.filter(pk=component.pk).update(
+            available_quantity=available, total_quantity=component.total_quantity if total is None else total,
+        )
+        component.refresh_from_db()
+
+
+class LookupCacheTests(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # 20 requests, each with the same two components
+        cls.make_many(20)
+
+    def test_each_component_and_category_loaded_once(self):
+        requests = list(Request.objects.prefetch_related('items'))
+        lookups = LookupCache.for_requests(requests)
+        data = ItemRequestSerializer(requests, many=True, context={'lookups': lookups}).data
+
+        self.assertEqual(lookups.component_queries, 1)
+        self.assertEqual(lookups.category_queries, 1)
+        names = {(i['component_name'], i['category_name']) for r in data for i in r['items']}
+        self.assertEqual(names, {('Arduino', 'Boards'), ('DHT11', 'Sensors')})
+
+    def test_serializing_list_queries_do_not_grow_with_items(self):
+        requests = list(Request.objects.for_listing().prefetch_related('items'))
+        lookups = LookupCache.for_requests(requests)
+        # One component load + one category dict, regardless of 40 items
+        with self.assertNumQueries(1):
+            ItemRequestSerializer(requests, many=True, context={'lookups': lookups}).data
+
+    def test_request_list_and_history_endpoints(self):
+        response = self.client.get('/api/requests/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 20)
+        self.assertEqual(response.data[0]['items'][0]['category_name'], 'Boards')
+
+        response = self.client.get('/api/history/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 15)
+
+
+class RenderingTests(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for _ in range(5):
+            cls.make_request()
+
+    def expand(self, fields, rows):
+        """Inverse of renderers.compact, for checking round-trips."""
+        result = []
+        for row in rows:
+            obj = {}
+            for field, value in zip(fields, row):
+                if isinstance(field, dict):
+                    (name, sub), = field.items()
+                    obj[name] = self.expand(sub, value)
+                else:
+                    obj[field] = value
+            result.append(obj)
+        return result
+
+    def test_compact_round_trips_nested_rows(self):
+        data = [
+            {'id': 1, 'status': 'pending', 'items': [{'component_name': 'Arduino', 'quantity': 1}]},
+            {'id': 2, 'status': 'collected', 'items': []},
+        ]
+        packed = compact(data)
+        self.assertEqual(packed['fields'], ['id', 'status', {'items': ['component_name', 'quantity']}])
+        self.assertEqual(self.expand(packed['fields'], packed['rows']), data)
+        self.assertEqual(compact([]), {'fields': [], 'rows': []})
+        self.assertEqual(compact({'detail': 'x'}), {'detail': 'x'})
+
+    def test_compact_renderer_is_negotiated_from_accept(self):
+        plain = self.client.get('/api/requests/')
+        response = self.client.get('/api/requests/', HTTP_ACCEPT='application/vnd.idealab.compact+json')
+        self.assertEqual(response['Content-Type'], 'application/vnd.idealab.compact+json')
+        body = json.loads(response.content)
+        self.assertEqual(self.expand(body['fields'], body['rows']), json.loads(plain.content))
+
+    def test_paginated_results_are_compacted(self):
+        response = self.client.get('/api/history/', {'format': 'compact'})
+        body = json.loads(response.content)
+        self.assertEqual(body['count'], 5)
+        self.assertEqual(len(body['results']['rows']), 5)
+
+    def test_messagepack_renderer(self):
+        fake = mock.Mock(packb=lambda data, default: json.dumps(data, default=default).encode())
+        with mock.patch('inventory.renderers.msgpack', fake):
+            self.assertEqual(MessagePackRenderer().render({'id': 1}), b'{"id": 1}')
+            self.assertEqual(MessagePackRenderer().render(None), b'')
+
+    @mock.patch('inventory.renderers.msgpack', None)
+    def test_messagepack_is_not_acceptable_without_msgpack(self):
+        # settings only registers the renderer when msgpack is importable
+        with mock.patch.object(get_categories.cls, 'renderer_classes', [JSONRenderer, CompactJSONRenderer]):
+            response = self.client.get('/api/categories/', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response.status_code, 406)
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+
+class CompressionTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.body = json.dumps([{'component_name': 'Arduino', 'quantity': n} for n in range(50)]).encode()
+
+    def process(self, path, accept_encoding, **headers):
+        response = HttpResponse(self.body, content_type='application/json', headers=headers)
+        middleware = APICompressionMiddleware(lambda request: response)
+        return middleware(self.factory.get(path, HTTP_ACCEPT_ENCODING=accept_encoding))
+
+    def test_gzip_when_brotli_is_unavailable(self):
+        with mock.patch('inventory.middleware.brotli', None):
+            response = self.process('/api/requests/', 'gzip, deflate, br')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), self.body)
+
+    def test_brotli_when_accepted(self):
+        fake = mock.Mock(compress=lambda data, quality: zlib.compress(data))
+        with mock.patch('inventory.middleware.brotli', fake):
+            response = self.process('/api/requests/', 'gzip, br')
+            gzipped = self.process('/api/requests/', 'gzip')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(response['Content-Length'], str(len(response.content)))
+        self.assertEqual(zlib.decompress(response.content), self.body)
+        self.assertEqual(gzipped['Content-Encoding'], 'gzip')
+
+    def test_non_api_and_encoded_responses_are_untouched(self):
+        fake = mock.Mock(compress=lambda data, quality: zlib.compress(data))
+        with mock.patch('inventory.middleware.brotli', fake):
+            page = self.process('/dashboard/', 'gzip, br')
+            encoded = self.process('/api/requests/', 'gzip, br', **{'Content-Encoding': 'identity'})
+        self.assertFalse(page.has_header('Content-Encoding'))
+        self.assertFalse(page.has_header('Vary'))
+        self.assertEqual(page.content, self.body)
+        self.assertEqual(encoded['Content-Encoding'], 'identity')
+        self.assertEqual(encoded.content, self.body)
+
+    def test_small_responses_are_not_compressed(self):
+        self.body = b'[]'
+        response = self.process('/api/requests/', 'gzip, br')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+class ArchiveTests(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        old = timezone.now() - timedelta(days=400)
+        for status, issued, returned in [('returned', 1, 1), ('rejected', 0, 0), ('collected', 1, 0)]:
+            req = Request.objects.create(student=cls.student, status=status)
+            RequestItem.objects.create(
+                request=req, component=cls.arduino, quantity=1, issued_quantity=issued, returned_quantity=returned,
+            )
+            Request.objects.filter(pk=req.pk).update(requested_at=old)
+        cls.recent = Request.objects.create(student=cls.student, status='returned')  # recent, stays hot
+
+    def test_moves_only_old_finished_requests(self):
+        moved = archive_finished_requests(timezone.now() - timedelta(days=180), chunk_size=1)
+
+        self.assertEqual(moved, 2)
+        self.assertEqual(set(Request.objects.values_list('status', flat=True)), {'collected', 'returned'})
+        self.assertEqual(ArchivedRequestItem.objects.count(), 2)
+
+    def test_archived_lines_keep_their_kit(self):
+        kit = Kit.objects.create(name='Starter Kit')
+        RequestItem.objects.filter(request__status='returned').update(kit=kit)
+        archive_finished_requests(timezone.now() - timedelta(days=180))
+
+        self.assertEqual(ArchivedRequestItem.objects.get(request__status='returned').kit, kit)
+        rows = self.client.get('/api/history/', {'outstanding': 'false'}).data['results']
+        self.assertIn(kit.pk, [item['kit'] for row in rows for item in row['items']])
+
+    def test_history_reads_archive_only_when_range_reaches_it(self):
+        archive_finished_requests(timezone.now() - timedelta(days=180))
+
+        response = self.client.get('/api/history/')
+        self.assertEqual(response.data['count'], 4)
+        self.assertEqual(response.data['results'][-1]['items'][0]['component_name'], 'Arduino')
+
+        today = timezone.now().date().isoformat()
+        self.assertFalse(history_needs_archive(today))
+        response = self.client.get('/api/history/', {'start_date': today, 'end_date': today})
+        self.assertEqual(response.data['count'], 1)
+
+    def test_archived_history_is_filtered_by_outstanding(self):
+        archive_finished_requests(timezone.now() - timedelta(days=180))
+
+        out = self.client.get('/api/history/', {'outstanding': 'true'})
+        self.assertEqual([r['status'] for r in out.data['results']], ['collected'])
+        done = self.client.get('/api/history/', {'outstanding': 'false'})
+        self.assertEqual(sorted(r['status'] for r in done.data['results']), ['rejected', 'returned', 'returned'])
+
+    def test_archived_history_follows_ordering(self):
+        archive_finished_requests(timezone.now() - timedelta(days=180))
+
+        by_outstanding = self.client.get('/api/history/', {'ordering': '-outstanding'})
+        self.assertEqual(by_outstanding.data['results'][0]['status'], 'collected')
+        oldest_first = self.client.get('/api/history/', {'ordering': 'requested_at'})
+        self.assertEqual(oldest_first.data['count'], 4)
+        self.assertEqual(oldest_first.data['results'][-1]['id'], self.recent.pk)
+
+
+class PollingTests(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.req = cls.make_request(items=((cls.arduino, 2),))
+
+    def test_identical_polls_share_one_computation(self):
+        self.client.get('/api/requests/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/requests/')
+        self.assertEqual(len(response.data), 1)
+
+    def test_writes_invalidate_coalesced_responses(self):
+        self.client.get('/api/requests/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/requests/{self.req.pk}/update/', {'status': 'rejected'}, format='json')
+        response = self.client.get('/api/requests/')
+        self.assertEqual(response.data[0]['status'], 'rejected')
+
+    def test_invalidation_waits_for_commit(self):
+        generation = cache.get_or_set(GENERATION_KEY, 0, None)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.patch(f'/api/requests/{self.req.pk}/update/', {'status': 'rejected'}, format='json')
+            self.assertEqual(cache.get(GENERATION_KEY), generation)
+        self.assertIn(invalidate_coalesced, callbacks)
+        callbacks[callbacks.index(invalidate_coalesced)]()
+        self.assertEqual(cache.get(GENERATION_KEY), generation + 1)
+
+    @mock.patch.object(RequestListThrottle, 'rate', '2/min', create=True)
+    def test_polling_is_throttled_per_token(self):
+        statuses = [self.client.get('/api/requests/', {'n': n}).status_code for n in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+
+
+class ForecastingTests(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.set_stock(cls.arduino, 2)
+        cls.idle = Component.objects.create(name='Idle', category=cls.boards, total_quantity=10, available_quantity=10)
+        # Two weeks of daily loans of 3; the last two days' are still out
+        for days_ago in range(14):
+            out = days_ago < 2
+            req = Request.objects.create(student=cls.student, status='collected' if out else 'returned')
+            RequestItem.objects.create(
+                request=req, component=cls.arduino, quantity=3, issued_quantity=3, returned_quantity=0 if out else 3,
+            )
+            Request.objects.filter(pk=req.pk).update(requested_at=timezone.now() - timedelta(days=days_ago))
+
+    def test_rollup_and_recommendations(self):
+        self.assertEqual(rollup_daily_demand(), 14)
+        self.assertEqual(rollup_daily_demand(), 2)  # Incremental: the last day, plus yesterday's open loan
+        compute_recommendations()
+
+        busy = RestockRecommendation.objects.get(component=self.arduino)
+        self.assertAlmostEqual(busy.avg_daily_7, 3)
+        self.assertEqual(busy.outstanding, 6)
+        self.assertGreater(busy.suggested_order, 0)
+        self.assertEqual(RestockRecommendation.objects.get(component=self.idle).suggested_order, 0)
+
+    def test_units_on_loan_count_as_owned(self):
+        rollup_daily_demand()
+        compute_recommendations()
+        busy = RestockRecommendation.objects.get(component=self.arduino)
+        # 2 on the shelf + 6 out on loan
+        self.assertEqual(busy.suggested_order, busy.reorder_point - 8)
+
+    def test_rollup_picks_up_issues_on_old_open_requests(self):
+        old = Request.objects.create(student=self.student, status='approved')
+        line = RequestItem.objects.create(request=old, component=self.idle, quantity=4)
+        day = timezone.now() - timedelta(days=10)
+        Request.objects.filter(pk=old.pk).update(requested_at=day)
+        rollup_daily_demand()
+
+        line.issued_quantity = 4
+        line.save()
+        Request.objects.filter(pk=old.pk).update(status='collected')
+        rollup_daily_demand()
+        self.assertEqual(ComponentDailyDemand.objects.get(component=self.idle).issued, 4)
+
+        line.delete()
+        rollup_daily_demand()
+        self.assertFalse(ComponentDailyDemand.objects.filter(component=self.idle).exists())
+
+
+class KitTests(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.set_stock(cls.arduino, 5)
+        jumpers = Component.objects.create(name='Jumper Set', category=cls.boards, total_quantity=10, available_quantity=7)
+        cls.kit = Kit.objects.create(name='Starter Kit')
+        KitComponent.objects.create(kit=cls.kit, component=cls.arduino, quantity=1)
+        KitComponent.objects.create(kit=cls.kit, component=jumpers, quantity=2)
+        cls.empty = Kit.objects.create(name='Empty Kit')
+
+    def test_availability_for_all_kits_in_one_query(self):
+        with self.assertNumQueries(1):
+            available = dict(kits_with_availability().values_list('name', 'available_kits'))
+        self.assertEqual(available, {'Starter Kit': 3, 'Empty Kit': 0})
+
+    def test_new_request_expands_kits(self):
+        self.client.force_login(self.student)
+        self.client.post('/new_request/', {'kit_id[]': [self.kit.pk], 'kit_quantity[]': [2], 'component_name[]': [''], 'quantity[]': [1]})
+
+        items = RequestItem.objects.filter(request__student=self.student, kit=self.kit)
+        self.assertEqual(sorted(items.values_list('component__name', 'quantity')), [('Arduino', 2), ('Jumper Set', 4)])
+
+    def test_new_request_rejects_bad_kit_quantities_without_side_effects(self):
+        self.client.force_login(self.student)
+        for quantity, error in (('', None), ('two', 'whole number'), ('-1', 'negative'), ('4', 'Only 3 Starter Kit kits')):
+            with self.subTest(quantity=quantity):
+                response = self.client.post('/new_request/', {
+                    'kit_id[]': [self.kit.pk], 'kit_quantity[]': [quantity], 'component_name[]': [''], 'quantity[]': [''],
+                })
+                if error is None:
+                    self.assertEqual(response.status_code, 302)
+                else:
+                    self.assertContains(response, error, status_code=400)
+                self.assertFalse(Request.objects.filter(student=self.student).exists())
+
+
+class WaitlistTests(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.waiters = [User.objects.create_user(f'waiter{n}', password='pw', role='student') for n in range(3)]
+        cls.set_stock(cls.arduino, 0, total=3)
+        cls.loan = Request.objects.create(student=cls.student, status='collected')
+        RequestItem.objects.create(request=cls.loan, component=cls.arduino, quantity=3, issued_quantity=3)
+
+    def test_out_of_stock_request_joins_waitlist(self):
+        self.client.force_login(self.student)
+        response = self.client.post('/new_request/', {'component_name[]': ['Arduino'], 'quantity[]': [2]}, follow=True)
+        self.assertContains(response, 'Waitlist')
+
+        self.assertTrue(WaitlistEntry.objects.filter(student=self.student, quantity=2, status='waiting').exists())
+        self.assertFalse(Request.objects.filter(student=self.student, status='pending').exists())
+
+    def test_returns_are_allocated_in_priority_then_fifo_order(self):
+        first = WaitlistEntry.objects.create(component=self.arduino, student=self.waiters[0], quantity=2)
+        WaitlistEntry.objects.create(component=self.arduino, student=self.waiters[1], quantity=2)
+        urgent = WaitlistEntry.objects.create(component=self.arduino, student=self.waiters[2], quantity=1, priority=-1)
+
+        self.client.patch(f'/api/requests/{self.loan.pk}/update/', {'status': 'processing_return', 'issued_items': {'0': 3}}, format='json')
+
+        served = set(WaitlistEntry.objects.filter(status='allocated').values_list('pk', flat=True))
+        self.assertEqual(served, {urgent.pk, first.pk})
+        self.arduino.refresh_from_db()
+        self.assertEqual(self.arduino.available_quantity, 0)
+        self.assertEqual(Request.objects.filter(status='approved').count(), 2)
+
+        # Issuing a waitlist request doesn't deduct the reserved units twice
+        reserved = WaitlistEntry.objects.get(pk=first.pk).request
+        self.client.patch(f'/api/requests/{reserved.pk}/update/', {'status': 'collected'}, format='json')
+        self.arduino.refresh_from_db()
+        self.assertEqual(self.arduino.available_quantity, 0)
+
+
+class JobQueueTests(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.req = Request.objects.create(student=cls.incharge, status='returned')
+
+    def test_export_runs_in_worker_and_is_downloadable(self):
+        job = enqueue('export_requests_csv', user=self.incharge, request_ids=[self.req.pk])
+        self.assertEqual(self.client.get(f'/api/jobs/{job.pk}/').data['status'], 'queued')
+
+        self.assertEqual(run_pending_jobs(), 1)
+
+        self.assertEqual(self.client.get(f'/api/jobs/{job.pk}/').data['status'], 'succeeded')
+        response = self.client.get(f'/api/jobs/{job.pk}/download/')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn(f'{self.req.pk},incharge,returned', response.content.decode())
+
+    def test_jobs_are_private_to_their_creator(self):
+        job = enqueue('export_requests_csv', user=User.objects.create_user('other', password='pw'), request_ids=[])
+        run_pending_jobs()
+        student = APIClient()
+        student.force_authenticate(self.student)
+        self.assertEqual(student.get(f'/api/jobs/{job.pk}/').status_code, 404)
+        self.assertEqual(student.get(f'/api/jobs/{job.pk}/download/').status_code, 404)
+
+        self.assertEqual(self.client.get(f'/api/jobs/{job.pk}/download/').status_code, 200)
+
+    def test_jobs_of_dead_workers_are_requeued(self):
+        job = enqueue('export_requests_csv', user=self.incharge, max_attempts=2, request_ids=[self.req.pk])
+        claim_job()  # ...and the worker dies
+        self.assertEqual(reclaim_stale_jobs(), 0)
+
+        later = timezone.now() + timedelta(seconds=settings.JOB_LEASE_SECONDS + 1)
+        with self.assertLogs('inventory.jobs', 'WARNING'):
+            self.assertEqual(reclaim_stale_jobs(later), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+
+        # Out of attempts: a second lost run fails the job
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        claim_job()
+        with self.assertLogs('inventory.jobs', 'WARNING'):
+            reclaim_stale_jobs(timezone.now() + timedelta(seconds=settings.JOB_LEASE_SECONDS + 1))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+        self.assertIn('heartbeat', job.error)
+
+    def test_failed_jobs_are_retried_then_marked_failed(self):
+        calls = []
+
+        @task('flaky')
+        def flaky(job):
+            calls.append(job.attempts)
+            raise RuntimeError('boom')
+        self.addCleanup(TASKS.pop, 'flaky')
+
+        job = enqueue('flaky', max_attempts=2)
+        with self.assertLogs('inventory.jobs', 'ERROR'):
+            run_pending_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        with self.assertLogs('inventory.jobs', 'ERROR'):
+            run_pending_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.status, calls), ('failed', [1, 2]))
+        self.assertIn('boom', job.error)
+
+
+class RequestTotalsTests(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.req = cls.make_request(items=((cls.arduino, 3), (cls.arduino, 2)))
+
+    def totals(self):
+        self.req.refresh_from_db()
+        return [getattr(self.req, field) for field in Request.TOTAL_FIELDS]
+
+    def test_issue_and_return_keep_totals_in_step(self):
+        self.assertEqual(self.totals(), [2, 5, 0, 0, 0])
+
+        self.client.patch(f'/api/requests/{self.req.pk}/update/', {'status': 'collected', 'issued_items': {'1': 1}}, format='json')
+        self.assertEqual(self.totals(), [2, 5, 4, 0, 4])
+        self.assertEqual(self.client.get('/api/requests/', {'outstanding': 'true'}).data[0]['outstanding'], 4)
+
+        self.client.patch(f'/api/requests/{self.req.pk}/update/', {'status': 'processing_return', 'issued_items': {'0': 3, '1': 1}}, format='json')
+        self.assertEqual(self.totals(), [2, 5, 4, 4, 0])
+        self.assertEqual(self.req.status, 'returned')
+
+    def test_admin_refuses_return_when_an_over_return_hides_a_short_line(self):
+        first, second = self.req.items.order_by('pk')
+        RequestItem.objects.filter(pk=first.pk).update(issued_quantity=3, returned_quantity=4)
+        RequestItem.objects.filter(pk=second.pk).update(issued_quantity=2, returned_quantity=1)
+        Request.objects.filter(pk=self.req.pk).update(status='collected', total_issued=5, total_returned=5, outstanding=0)
+        self.req.refresh_from_db()
+        self.assertTrue(self.req.all_returned)
+
+        request = RequestFactory().post('/')
+        request.user = self.incharge
+        request.session = {}
+        request._messages = FallbackStorage(request)
+        self.req.status = 'returned'
+        RequestAdmin(Request, admin.site).save_model(request, self.req, None, True)
+
+        self.req.refresh_from_db()
+        self.assertEqual(self.req.status, 'collected')
+        self.assertIn('still missing 1 units', [str(m) for m in request._messages][0])
+
+    def test_check_command_repairs_drift(self):
+        Request.objects.filter(pk=self.req.pk).update(total_requested=99)
+        out = io.StringIO()
+        call_command('check_request_totals', '--repair', stdout=out)
+        self.assertIn('Repaired 1', out.getvalue())
+        self.assertEqual(self.totals(), [2, 5, 0, 0, 0])
+
+
+class StockAuditTests(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # The admin edit needs a superuser
+        User.objects.filter(pk=cls.incharge.pk).update(is_superuser=True)
+        cls.incharge.refresh_from_db()
+        cls.req = cls.make_request(items=((cls.arduino, 1), (cls.arduino, 2), (cls.arduino, 3)))
+
+    def test_issue_is_audited_with_one_insert(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/requests/{self.req.pk}/update/', {'status': 'collected'}, format='json')
+
+        entries = StockAuditEntry.objects.filter(component=self.arduino, reason='issue')
+        self.assertEqual(sorted(entries.values_list('delta', flat=True)), [-3, -2, -1])
+        self.assertEqual({e.request_ref for e in entries}, {self.req.pk})
+        response = self.client.get('/api/audit/', {'component': self.arduino.pk})
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(response.data['results'][0]['user'], 'incharge')
+
+        today = timezone.now().date()
+        # A date-only end covers that whole day
+        self.assertEqual(self.client.get('/api/audit/', {'start': today.isoformat(), 'end': today.isoformat()}).data['count'], 3)
+        self.assertEqual(self.client.get('/api/audit/', {'end': today.isoformat()}).data['count'], 3)
+        yesterday = (today - timedelta(days=1)).isoformat()
+        self.assertEqual(self.client.get('/api/audit/', {'end': yesterday}).data['count'], 0)
+
+    def test_audit_rejects_malformed_filters(self):
+        for params in ({'start': 'garbage'}, {'start': '2026-13-45'}, {'end': '2026-01-01T25:00'}, {'component': 'abc'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/api/audit/', params).status_code, 400)
+
+    def test_audit_batch_writes_once_and_not_on_rollback(self):
+        # Audit insert + stock-level read and insert, however many records
+        with self.assertNumQueries(3), self.captureOnCommitCallbacks(execute=True):
+            with audit_batch(self.incharge):
+                for _ in range(5):
+                    record(self.arduino.pk, -1, 'issue')
+        self.assertEqual(StockAuditEntry.objects.count(), 5)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic(), audit_batch(self.incharge):
+                    record(self.arduino.pk, -1, 'issue')
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertEqual(StockAuditEntry.objects.count(), 5)
+
+    def test_item_post_and_admin_edit_are_audited(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/items/', {'name': 'ESP32', 'category': self.boards.pk, 'total_quantity': 4}, format='json')
+        self.assertTrue(StockAuditEntry.objects.filter(reason='stock_added', delta=4).exists())
+
+        self.client.force_login(self.incharge)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/admin/inventory/component/{self.arduino.pk}/change/', {
+                'name': 'Arduino', 'category': self.boards.pk, 'total_quantity': 10, 'available_quantity': 7,
+            })
+        self.assertTrue(StockAuditEntry.objects.filter(reason='admin_edit', delta=-3).exists())
+
+
+# ==========================================
+# 🧪 API / FLOW SUITE WITH PERFORMANCE BUDGETS
+# ==========================================
+
+class AuthApiTests(ApiTestCase):
+    def test_incharge_login_returns_token(self):
+        response = APIClient().post('/api/login/', {'username': 'incharge', 'password': 'pw'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['token'], self.token.key)
+
+    def test_student_cannot_log_in_to_app(self):
+        response = APIClient().post('/api/login/', {'username': 'stu@college.edu', 'password': 'pw'})
+        self.assertEqual(response.status_code, 403)
+
+    def test_unauthenticated_requests_are_rejected(self):
+        self.assertEqual(APIClient().get('/api/requests/').status_code, 401)
+
+    def test_cached_token_costs_no_queries(self):
+        self.client.get('/api/categories/')
+        with self.assertNumQueries(1):  # Just the categories
+            self.client.get('/api/categories/')
+
+    def test_cached_auth_returns_a_token_without_the_password_hash(self):
+        self.client.get('/api/categories/')
+        cached = cache.get(CACHE_PREFIX + self.token.key)
+        self.assertNotIn(self.incharge.password, repr(cached))
+
+        response = self.client.get('/api/categories/')
+        auth, user = response.wsgi_request.auth, response.wsgi_request.user
+        self.assertIsInstance(auth, Token)
+        self.assertEqual((auth.key, auth.user, auth.created), (self.token.key, self.incharge, self.token.created))
+        self.assertEqual((user.username, user.is_staff), ('incharge', True))
+
+    @override_settings(TOKEN_EXPIRE_SECONDS=60)
+    def test_expired_token_is_rejected_and_rotated_on_login(self):
+        Token.objects.filter(pk=self.token.pk).update(created=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(self.client.get('/api/categories/').status_code, 401)
+
+        response = APIClient().post('/api/login/', {'username': 'incharge', 'password': 'pw'})
+        self.assertNotEqual(response.data['token'], self.token.key)
+
+    def test_logout_revokes_token(self):
+        self.client.get('/api/categories/')
+        self.assertEqual(self.client.post('/api/logout/').status_code, 200)
+        self.assertEqual(self.client.get('/api/categories/').status_code, 401)
+
+    def test_deactivated_user_loses_access(self):
+        self.client.get('/api/categories/')
+        self.incharge.is_active = False
+        self.incharge.save()
+        self.assertEqual(self.client.get('/api/categories/').status_code, 401)
+
+
+class StudentPortalTests(ApiTestCase):
+    def test_signup_creates_user_and_profile(self):
+        response = self.client.post('/signup/', {
+            'email': 'new@college.edu', 'password': 'pw', 'name': 'New', 'student_id': 'MEC21CS099',
+        })
+        self.assertRedirects(response, '/dashboard/')
+        user = User.objects.get(username='new@college.edu')
+        self.assertEqual((user.role, user.roll_number), ('student', 'MEC21CS099'))
+
+    def test_signup_rejects_duplicate_email(self):
+        response = self.client.post('/signup/', {
+            'email': 'stu@college.edu', 'password': 'pw', 'name': 'Dup', 'student_id': 'MEC21CS100',
+        })
+        self.assertContains(response, 'Email already registered')
+
+    def test_new_request_page_lists_components(self):
+        self.client.force_login(self.student)
+        self.assertContains(self.client.get('/new_request/'), 'Arduino')
+
+    def test_new_request_creates_items_and_skips_unknown_names(self):
+        self.client.force_login(self.student)
+        self.client.post('/new_request/', {
+            'component_name[]': ['Arduino', 'Flux Capacitor', 'DHT11'], 'quantity[]': [2, 1, 3],
+        })
+        req = Request.objects.get(student=self.student)
+        self.assertEqual(sorted(req.items.values_list('component__name', 'quantity')), [('Arduino', 2), ('DHT11', 3)])
+        self.assertEqual(req.status, 'pending')
+
+    def test_dashboard_shows_own_requests(self):
+        req = self.make_request()
+        self.client.force_login(self.student)
+        self.assertContains(self.client.get('/dashboard/'), f'#{req.pk}')
+
+
+class RequestListApiTests(ApiTestCase):
+    def test_query_count_does_not_grow_with_requests(self):
+        self.make_many(5)
+        self.client.get('/api/categories/')  # Warm the token cache
+        # requests + prefetched items + components + categories
+        with self.assertNumQueries(4):
+            self.client.get('/api/requests/')
+
+        self.make_many(45)
+        cache.clear()  # Drop the coalesced response
+        self.client.get('/api/categories/')
+        with self.assertNumQueries(4), time_budget(self, 1.0):
+            response = self.client.get('/api/requests/')
+        self.assertEqual(len(response.data), 50)
+
+    def test_rows_carry_names_and_totals(self):
+        self.make_request(items=((self.dht11, 3),))
+        row = self.client.get('/api/requests/').data[0]
+        self.assertEqual(row['student_id'], 'MEC21CS001')
+        self.assertEqual(row['student_name'], 'Anu')
+        self.assertEqual(row['items'][0]['category_name'], 'Sensors')
+        self.assertEqual(row['total_requested'], 3)
+
+
+class HistoryApiTests(ApiTestCase):
+    def test_search_by_roll_number_name_and_username(self):
+        self.make_request()
+        other = User.objects.create_user('zed', password='pw', first_name='Zed', role='student')
+        self.make_request(student=other)
+
+        for query in ('CS001', 'anu', 'stu@'):
+            response = self.client.get('/api/history/', {'student_id': query})
+            self.assertEqual(response.data['count'], 1, query)
+
+    def test_date_range_filter(self):
+        old = self.make_request()
+        Request.objects.filter(pk=old.pk).update(requested_at=timezone.now() - timedelta(days=30))
+        self.make_request()
+        today = timezone.now().date()
+
+        response = self.client.get('/api/history/', {'start_date': today.isoformat(), 'end_date': today.isoformat()})
+        self.assertEqual(response.data['count'], 1)
+        response = self.client.get('/api/history/', {
+            'start_date': (today - timedelta(days=31)).isoformat(), 'end_date': today.isoformat(),
+        })
+        self.assertEqual(response.data['count'], 2)
+
+    def test_pages_of_15_with_constant_queries(self):
+        self.make_many(40)
+        self.client.get('/api/categories/')
+        # count + archive check + page + items + components + categories
+        with self.assertNumQueries(6), time_budget(self, 1.0):
+            response = self.client.get('/api/history/', {'page': 2})
+        self.assertEqual(response.data['count'], 40)
+        self.assertEqual(len(response.data['results']), 15)
+
+
+class UpdateStatusApiTests(ApiTestCase):
+    def patch(self, req, **data):
+        return self.client.patch(f'/api/requests/{req.pk}/update/', data, format='json')
+
+    def test_status_is_required(self):
+        self.assertEqual(self.patch(self.make_request()).status_code, 400)
+
+    def test_issue_uses_overrides_and_deducts_stock(self):
+        req = self.make_request(items=((self.arduino, 3), (self.dht11, 5)))
+        response = self.patch(req, status='collected', issued_items={'1': 4})
+
+        self.assertEqual(response.data['current_status'], 'collected')
+        self.assertEqual(list(req.items.order_by('id').values_list('issued_quantity', flat=True)), [3, 4])
+        self.arduino.refresh_from_db()
+        self.dht11.refresh_from_db()
+        self.assertEqual((self.arduino.available_quantity, self.dht11.available_quantity), (7, 16))
+
+    def test_partial_return_stays_collected_then_full_return_closes(self):
+        req = self.make_request(items=((self.arduino, 2),))
+        self.patch(req, status='collected')
+
+        self.assertEqual(self.patch(req, status='processing_return', issued_items={'0': 1}).data['current_status'], 'collected')
+        response = self.patch(req, status='processing_return', issued_items={'0': 1})
+        self.assertEqual(response.data['current_status'], 'returned')
+        self.assertIsNotNone(response.data['returned_at'])
+        self.arduino.refresh_from_db()
+        self.assertEqual(self.arduino.available_quantity, 10)
+
+    def test_over_return_is_ignored(self):
+        req = self.make_request(items=((self.arduino, 1),))
+        self.patch(req, status='collected')
+        self.patch(req, status='processing_return', issued_items={'0': 5})
+        self.arduino.refresh_from_db()
+        self.assertEqual(self.arduino.available_quantity, 9)
+
+    def test_reject(self):
+        req = self.make_request()
+        self.assertEqual(self.patch(req, status='rejected').data['current_status'], 'rejected')
+
+    def test_issue_query_budget(self):
+        lines = 10
+        req = self.make_request(items=[(self.arduino, 1)] * lines)
+        self.client.get('/api/categories/')
+        # Fixed: savepoint, request, waitlist check, item load, request save, release.
+        # Per line: item save, totals delta, component lock and stock update (audit is written on commit).
+        # Per-line stock updates are deliberate; this guards against new per-line lookups.
+        with self.assertNumQueries(6 + 4 * lines), time_budget(self, 1.0):
+            self.patch(req, status='collected')
+
+
+class InventoryApiTests(ApiTestCase):
+    def test_item_list(self):
+        self.client.get('/api/categories/')
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/items/')
+        self.assertEqual({row['name']: row['category_name'] for row in response.data}, {'Arduino': 'Boards', 'DHT11': 'Sensors'})
+
+    def test_item_create_defaults_available_to_total(self):
+        response = self.client.post('/api/items/add/', {'name': 'ESP32', 'category': self.boards.pk, 'total_quantity': 6}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['available_quantity'], 6)
+
+    def test_item_create_validates(self):
+        response = self.client.post('/api/items/add/', {'name': 'ESP32', 'category': 999}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_categories(self):
+        self.assertEqual([c['name'] for c in self.client.get('/api/categories/').data], ['Boards', 'Sensors'])
+        self.assertEqual(self.client.post('/api/categories/add/', {'name': 'Tools'}).status_code, 201)
+        self.assertEqual(self.client.post('/api/categories/add/', {'name': 'Tools'}).status_code, 400)
+        self.assertEqual(self.client.post('/api/categories/add/', {}).status_code, 400)
+
+
+class ProjectionTests(ApiTestCase):
+    def test_user_listing_skips_password(self):
+        user = User.objects.for_listing().get(pk=self.student.pk)
+        self.assertIn('password', user.get_deferred_fields())
+        self.assertEqual(str(user), 'stu@college.edu')
+
+    def test_request_list_does_not_load_heavy_user_columns(self):
+        self.make_request()
+        self.client.get('/api/categories/')  # The token lookup loads the full user once, then it's cached
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/requests/')
+        sql = ' '.join(q['sql'] for q in queries.captured_queries)
+        self.assertIn('"first_name"', sql)
+        self.assertNotIn('"password"', sql)
+
+    def test_item_serialization_projection(self):
+        with self.assertNumQueries(1):
+            rows = ItemSerializer(Component.objects.for_serialization().order_by('name'), many=True).data
+        self.assertEqual(rows[0]['category_name'], 'Boards')
+
+    def test_admin_request_changelist(self):
+        self.make_request()
+        self.incharge.is_superuser = True
+        self.incharge.save()
+        self.client.force_login(self.incharge)
+        self.assertContains(self.client.get('/admin/inventory/request/'), 'stu@college.edu')
+        self.assertContains(self.client.get('/admin/users/user/'), 'stu@college.edu')
+
+    def test_benchmark_runs_and_rolls_back(self):
+        out = io.StringIO()
+        call_command('bench_projections', rows=20, stdout=out)
+        self.assertIn('requests+student', out.getvalue())
+        self.assertFalse(User.objects.filter(username__startswith='bench').exists())
+
+
+class ReportTests(ApiTestCase):
+    def test_student_and_component_totals(self):
+        loan = self.make_request(items=((self.arduino, 2), (self.dht11, 3)), status='collected')
+        RequestItem.objects.filter(request=loan).update(issued_quantity=F('quantity'))
+        RequestItem.objects.filter(request=loan, component=self.dht11).update(returned_quantity=1)
+        Request.objects.filter(pk=loan.pk).update(return_deadline=timezone.now().date() - timedelta(days=1))
+        other = User.objects.create_user('zed', password='pw', first_name='Zed', role='student')
+        self.make_request(student=other, items=((self.arduino, 1),), status='rejected')
+
+        students, components = build_reports(workers=1, shards=3)
+
+        self.assertEqual(students, [
+            ['', 'zed', 'Zed', 1, 1, 0, 0, 0, 0],
+            ['MEC21CS001', 'stu@college.edu', 'Anu K', 1, 5, 5, 1, 4, 1],
+        ])
+        self.assertEqual(components, [
+            ['Arduino', 'Boards', 2, 3, 2, 0, 2],
+            ['DHT11', 'Sensors', 1, 3, 3, 1, 2],
+        ])
+
+    def test_shards_cover_the_id_range(self):
+        for n in range(5):
+            user = User.objects.create_user(f's{n}', password='pw', role='student')
+            self.make_request(student=user)
+        ranges = student_ranges(3)
+        self.assertEqual(len(ranges), 3)
+        self.assertEqual(ranges[0][0], User.objects.get(username='s0').pk)
+        self.assertEqual(ranges[-1][1], User.objects.get(username='s4').pk)
+        self.assertTrue(all(a[1] + 1 == b[0] for a, b in zip(ranges, ranges[1:])))
+
+    def test_command_writes_csv(self):
+        self.make_request()
+        with tempfile.TemporaryDirectory() as out:
+            call_command('generate_reports', workers=1, output_dir=out, stdout=io.StringIO())
+            with open(os.path.join(out, 'student_utilization.csv')) as f:
+                rows = list(csv.reader(f))
+        self.assertEqual(rows[0][0], 'Roll No')
+        self.assertEqual(rows[1][:2], ['MEC21CS001', 'stu@college.edu'])
+
+
+class StudentIdentityTests(ApiTestCase):
+    def test_roll_numbers_are_normalized_and_unique(self):
+        user = User.objects.create_user('x', password='pw', role='student', roll_number=' mec21cs002 ')
+        self.assertEqual(user.roll_number, 'MEC21CS002')
+        self.assertEqual(User.objects.by_roll_number('mec21cs002 ').get(), user)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            User.objects.create_user('y', password='pw', role='student', roll_number='MEC21CS002')
+
+    def test_roll_numbers_with_separators_are_kept_whole(self):
+        first = User.objects.create_user('a', password='pw', role='student', roll_number='mec/21/cs/001')
+        second = User.objects.create_user('b', password='pw', role='student', roll_number='MEC/22/CS/001')
+        self.assertEqual((first.roll_number, second.roll_number), ('MEC/21/CS/001', 'MEC/22/CS/001'))
+
+        self.assertEqual(self.client.get('/api/students/lookup/', {'code': 'mec/21/cs/001'}).data['id'], first.pk)
+        # A payload tail only applies when the literal code isn't a roll number
+        self.assertEqual(self.client.get('/api/students/lookup/', {'code': 'IDEALAB:MEC21CS001'}).data['id'], self.student.pk)
+
+    def test_roll_number_migration_reports_case_clashes(self):
+        migration = importlib.import_module('inventory.migrations.0017_move_roll_number_to_user')
+        rows = [(1, 'mec21cs001'), (2, ' MEC21CS001'), (3, 'MEC21CS002'), (4, '')]
+        self.assertEqual(migration.roll_number_clashes(rows), {'MEC21CS001': [1, 2]})
+
+    def test_signup_rejects_duplicate_roll_number_atomically(self):
+        response = self.client.post('/signup/', {
+            'email': 'other@college.edu', 'password': 'pw', 'name': 'Dup', 'student_id': 'mec21cs001',
+        })
+        self.assertContains(response, 'Roll number already registered')
+        self.assertFalse(User.objects.filter(username='other@college.edu').exists())
+
+    def test_lookup_returns_open_loans_in_one_query(self):
+        loan = self.make_request(items=((self.arduino, 2), (self.dht11, 1)), status='collected')
+        self.make_request(status='returned')
+        self.client.get('/api/categories/')
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/students/lookup/', {'code': 'https://idealab.example/s/mec21cs001/'})
+
+        self.assertEqual(response.data['name'], 'Anu K')
+        self.assertEqual([l['id'] for l in response.data['loans']], [loan.pk])
+        self.assertEqual([i['component_name'] for i in response.data['loans'][0]['items']], ['Arduino', 'DHT11'])
+
+    def test_lookup_without_open_loans_and_unknown_code(self):
+        self.assertEqual(self.client.get('/api/students/lookup/', {'code': 'MEC21CS001'}).data['loans'], [])
+        self.assertEqual(self.client.get('/api/students/lookup/', {'code': 'NOPE'}).status_code, 404)
+        self.assertEqual(self.client.get('/api/students/lookup/').status_code, 404)
+
+
+class ScanTests(ApiTestCase):
+    def scan(self, action, *scans):
+        return self.client.post('/api/scans/', {
+            'action': action, 'scans': [{'code': c, 'component': comp, 'qty': q} for c, comp, q in scans],
+        }, format='json')
+
+    def test_issue_by_roll_number_and_label_codes(self):
+        Component.objects.filter(pk=self.arduino.pk).update(code='ARD-UNO')
+        req = self.make_request(items=((self.arduino, 2), (self.dht11, 1)), status='approved')
+
+        response = self.scan('issue', ('mec21cs001', 'ARD-UNO', 1), ('IDEALAB:MEC21CS001', 'ARD-UNO', 1), (f'R{req.pk}', 'DHT11', 1))
+
+        self.assertTrue(all(r['ok'] for r in response.data['results']))
+        self.assertEqual(response.data['requests'][0]['status'], 'collected')
+        self.assertEqual(response.data['requests'][0]['total_issued'], 3)
+        self.arduino.refresh_from_db()
+        self.assertEqual(self.arduino.available_quantity, 8)
+        self.assertIsNotNone(Request.objects.get(pk=req.pk).collected_at)
+
+    def test_numeric_roll_numbers_mean_the_student(self):
+        numeric = User.objects.create_user('num', password='pw', role='student', roll_number='12345')
+        theirs = self.make_request(student=numeric, items=((self.arduino, 1),), status='approved')
+        # Another student's request whose id reads the same as the roll number
+        clash = Request.objects.create(id=12345, student=self.student, status='approved')
+        RequestItem.objects.create(request=clash, component=self.arduino, quantity=1)
+
+        response = self.scan('issue', ('12345', 'Arduino', 1), ('R12345', 'Arduino', 1))
+        # No student has roll number R12345, so that one is the request
+        self.assertEqual([r['request'] for r in response.data['results']], [theirs.pk, clash.pk])
+
+    def test_full_return_closes_request(self):
+        req = self.make_request(items=((self.arduino, 2),), status='approved')
+        self.scan('issue', (req.pk, self.arduino.pk, 2))
+
+        partial = self.scan('return', (req.pk, 'Arduino', 1))
+        self.assertEqual(partial.data['requests'][0]['status'], 'collected')
+        done = self.scan('return', (req.pk, 'Arduino', 1))
+        self.assertEqual(done.data['requests'][0]['status'], 'returned')
+        self.assertEqual(done.data['requests'][0]['outstanding'], 0)
+        self.arduino.refresh_from_db()
+        self.assertEqual(self.arduino.available_quantity, 10)
+
+    def test_bad_scans_are_reported_without_blocking_the_batch(self):
+        req = self.make_request(items=((self.arduino, 1),), status='approved')
+        response = self.scan('issue', (req.pk, 'Flux Capacitor', 1), (req.pk, 'Arduino', 2), (req.pk, 'Arduino', 1), ('', 'Arduino', 1))
+        self.assertEqual([r['ok'] for r in response.data['results']], [False, False, True, False])
+        self.assertEqual(self.scan('return', (req.pk, 'DHT11', 1)).data['results'][0]['ok'], False)
+        self.assertEqual(self.client.post('/api/scans/', {'scans': []}, format='json').status_code, 400)
+
+    def test_non_object_scans_are_reported(self):
+        req = self.make_request(items=((self.arduino, 1),), status='approved')
+        response = self.client.post('/api/scans/', {
+            'action': 'issue', 'scans': [f'R{req.pk}', None, {'code': req.pk, 'component': 'Arduino', 'qty': 1}],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r.get('error') for r in response.data['results']], ["Each scan must be an object"] * 2 + [None])
+
+    def test_waitlist_reservation_is_not_deducted_twice(self):
+        Component.objects.filter(pk=self.dht11.pk).update(available_quantity=0)
+        WaitlistEntry.objects.create(component=self.dht11, student=self.student, quantity=2)
+        Component.objects.filter(pk=self.dht11.pk).update(available_quantity=2)
+        allocate_waitlist([self.dht11.pk])
+        req = Request.objects.get(student=self.student, status='approved')
+
+        self.assertTrue(self.scan('issue', (req.pk, 'DHT11', 2)).data['results'][0]['ok'])
+        self.dht11.refresh_from_db()
+        self.assertEqual(self.dht11.available_quantity, 0)
+
+    def test_batch_cost_does_not_grow_with_scans(self):
+        def batch(n):
+            Component.objects.filter(pk=self.arduino.pk).update(total_quantity=1000, available_quantity=1000)
+            req = self.make_request(items=((self.arduino, n),), status='approved')
+            self.client.get('/api/categories/')
+            with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+                self.scan('issue', *[(req.pk, 'Arduino', 1)] * n)
+            # The audit insert may be split into batches by SQLite's parameter limit
+            return [q['sql'][:40] for q in queries.captured_queries if not q['sql'].startswith(('INSERT', 'SAVEPOINT', 'RELEASE'))]
+
+        small = batch(2)
+        with time_budget(self, 1.0):
+            large = batch(200)
+        self.assertEqual(small, large)
+        self.assertEqual(StockAuditEntry.objects.filter(reason='issue').count(), 202)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TransactionTestCase):
+    # TransactionTestCase: the replica alias is a second connection, so it only sees committed rows
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.incharge = User.objects.create_user('incharge', password='pw', is_staff=True, role='incharge')
+        student = User.objects.create_user('stu', password='pw', role='student')
+        component = Component.objects.create(
+            name='Arduino', category=Category.objects.create(name='Boards'), total_quantity=10, available_quantity=10,
+        )
+        self.req = Request.objects.create(student=student)
+        RequestItem.objects.create(request=self.req, component=component, quantity=1)
+        self.client = self.api_client(self.incharge)
+
+    def api_client(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=user).key)
+        client.get('/api/categories/')  # Warm the token cache
+        return client
+
+    def queries_by_alias(self, func):
+        with CaptureQueriesContext(connections['default']) as primary, CaptureQueriesContext(connections['replica']) as replica:
+            func()
+        return len(primary), len(replica)
+
+    def test_reads_stay_on_primary_unless_opted_in(self):
+        self.assertEqual(Request.objects.all().db, 'default')
+        with read_replica():
+            self.assertEqual(Request.objects.all().db, 'replica')
+            self.assertEqual(Request.objects.select_for_update().db, 'default')
+
+    def test_decorated_views_are_safe_across_threads(self):
+        both_inside = threading.Barrier(2, timeout=5)
+
+        @read_replica()
+        def view():
+            both_inside.wait()
+            return Request.objects.all().db
+
+        errors, aliases = [], []
+
+        def call():
+            try:
+                aliases.append(view())
+            except Exception as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=call) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(aliases, ['replica', 'replica'])
+
+    def test_history_reads_from_replica(self):
+        primary, replica = self.queries_by_alias(lambda: self.client.get('/api/history/'))
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_client_is_pinned_to_primary_after_a_write(self):
+        self.client.patch(f'/api/requests/{self.req.pk}/update/', {'status': 'rejected'}, format='json')
+        primary, replica = self.queries_by_alias(lambda: self.client.get('/api/history/'))
+        self.assertEqual(replica, 0)
+
+        # Other clients aren't pinned
+        other = self.api_client(User.objects.create_user('incharge2', password='pw', is_staff=True))
+        primary, replica = self.queries_by_alias(lambda: other.get('/api/history/'))
+        self.assertGreater(replica, 0)
+
+    def test_pinned_client_skips_coalesced_replica_responses(self):
+        other = self.api_client(User.objects.create_user('incharge2', password='pw', is_staff=True))
+        self.client.patch(f'/api/requests/{self.req.pk}/update/', {'status': 'rejected'}, format='json')
+        other.get('/api/history/')  # Computed from the replica and shared
+
+        primary, replica = self.queries_by_alias(lambda: self.client.get('/api/history/'))
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_pin_expires(self):
+        response = self.client.patch(f'/api/requests/{self.req.pk}/update/', {'status': 'rejected'}, format='json')
+        cache.delete(client_key(response.wsgi_request))
+        primary, replica = self.queries_by_alias(lambda: self.client.get('/api/history/'))
+        self.assertGreater(replica, 0)
+
+
+class StockHistoryTests(ApiTestCase):
+    def points(self, *samples):
+        StockLevelPoint.objects.bulk_create([
+            StockLevelPoint(component=self.arduino, at=at, level=level) for at, level in samples
+        ])
+
+    def test_audited_changes_record_levels(self):
+        req = self.make_request(items=((self.arduino, 3),))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/requests/{req.pk}/update/', {'status': 'collected'}, format='json')
+        self.assertEqual(list(StockLevelPoint.objects.values_list('component_id', 'level')), [(self.arduino.pk, 7)])
+
+    def test_hourly_and_daily_rollups(self):
+        day = datetime(2026, 3, 2)
+        self.points((day.replace(hour=9, minute=5), 10), (day.replace(hour=9, minute=40), 4),
+                    (day.replace(hour=9, minute=50), 6), (day.replace(hour=14), 8))
+        self.assertEqual(rollup_hourly(), 2)
+        self.assertEqual(rollup_daily(), 1)
+
+        nine = StockLevelHourly.objects.get(bucket=day.replace(hour=9))
+        self.assertEqual((nine.open, nine.low, nine.high, nine.close, nine.samples), (10, 4, 10, 6, 3))
+        daily = StockLevelDaily.objects.get()
+        self.assertEqual((daily.bucket, daily.open, daily.low, daily.high, daily.close, daily.samples), (day, 10, 4, 10, 8, 4))
+
+        # Incremental: the last hour/day is recomputed, not duplicated
+        self.points((day.replace(hour=14, minute=30), 2))
+        rollup_hourly()
+        rollup_daily()
+        self.assertEqual(StockLevelDaily.objects.get().low, 2)
+        self.assertEqual(StockLevelHourly.objects.count(), 2)
+
+    @override_settings(STOCK_HISTORY_RETENTION={'raw': 7, 'hour': 30, 'day': None})
+    def test_prune_respects_retention(self):
+        now = timezone.now()
+        self.points((now - timedelta(days=10), 1), (now - timedelta(days=1), 2))
+        rollup_hourly()
+        StockLevelHourly.objects.filter(bucket__lt=now - timedelta(days=5)).update(bucket=F('bucket') - timedelta(days=60))
+        self.assertEqual(prune(now), {'raw': 1, 'hour': 1})
+        self.assertEqual(StockLevelPoint.objects.get().level, 2)
+
+    def test_trend_picks_the_coarsest_needed_resolution(self):
+        now = timezone.now()
+        self.points(*[(now - timedelta(hours=n), n) for n in range(1, 4)])
+        rollup_hourly()
+        rollup_daily()
+
+        week = self.client.get(f'/api/items/{self.arduino.pk}/trend/', {'start': (now - timedelta(days=7)).date().isoformat()})
+        self.assertEqual(week.data['resolution'], 'raw')
+        self.assertEqual([p['level'] for p in week.data['points']], [3, 2, 1])
+
+        month = self.client.get(f'/api/items/{self.arduino.pk}/trend/', {'start': (now - timedelta(days=30)).date().isoformat(), 'resolution': 'hour'})
+        self.assertEqual(month.data['resolution'], 'hour')
+
+        with self.assertNumQueries(3):  # Component check + daily rows + level going into the range
+            year = self.client.get(f'/api/items/{self.arduino.pk}/trend/', {'start': (now - timedelta(days=365)).date().isoformat()})
+        self.assertEqual(year.data['resolution'], 'day')
+        self.assertEqual(year.data['points'][-1]['close'], 1)
+
+    def test_trend_validation(self):
+        self.assertEqual(self.client.get('/api/items/999/trend/').status_code, 404)
+        bad = self.client.get(f'/api/items/{self.arduino.pk}/trend/', {'start': '2026-05-01', 'end': '2026-04-01'})
+        self.assertEqual(bad.status_code, 400)
+        garbage = self.client.get(f'/api/items/{self.arduino.pk}/trend/', {'start': 'yesterday'})
+        self.assertEqual(garbage.status_code, 400)
+
+    def test_trend_accepts_utc_offsets(self):
+        response = self.client.get(f'/api/items/{self.arduino.pk}/trend/', {
+            'start': '2026-01-01T00:00:00+05:30', 'end': '2026-01-01T18:30:00Z',
+        })
+        self.assertEqual(response.status_code, 200)
+        # Converted to the (naive, Asia/Kolkata) local time the DB stores
+        self.assertEqual((response.data['start'], response.data['end']), (datetime(2026, 1, 1), datetime(2026, 1, 2)))
+        self.assertEqual(self.client.get('/api/audit/', {'start': '2026-01-01T00:00:00+05:30'}).status_code, 200)
@@ -0,0 +1,25 @@
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class TokenRateThrottle(SimpleRateThrottle):
+    """
+    Per-token throttle. Subclasses set ``scope``; the rate comes from
+    REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'][scope] so each endpoint is tuned separately.
+    """
+
+    def get_cache_key(self, request, view):
+        if request.auth is not None:
+            ident = str(request.auth)
+        elif request.user and request.user.is_authenticated:
+            ident = f"user-{request.user.pk}"
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+
+class RequestListThrottle(TokenRateThrottle):
+    scope = 'requests'
+
+
+class HistoryThrottle(TokenRateThrottle):
+    scope = 'history'
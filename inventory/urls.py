@@ -4,10 +4,13 @@ from . import views
 urlpatterns = [
     # API Endpoints
     path('api/login/', views.CustomAuthToken.as_view(), name='api-login'),
+    path('api/logout/', views.logout_token, name='api-logout'),
     path('api/requests/', views.request_list, name='api-request-list'),
     path('api/requests/<int:pk>/update/', views.update_request_status, name='api-update-status'),
     path('api/items/', views.item_list_create, name='items'),
     path('api/items/add/', views.item_list_create), # Reusing the same view for POST
+    path('api/items/kits/', views.kit_list, name='api-kits'),
+    path('api/items/<int:pk>/trend/', views.stock_trend, name='api-stock-trend'),
     
     # Web Endpoints
     path('dashboard/', views.dashboard, name='dashboard'),
@@ -16,4 +19,11 @@ urlpatterns = [
     path('api/history/', views.request_history, name='api-history'),
     path('api/categories/', views.get_categories, name='get_categories'),
     path('api/categories/add/', views.add_category, name='add_category'),
+    path('api/waitlist/', views.waitlist, name='api-waitlist'),
+    path('api/students/lookup/', views.student_lookup, name='api-student-lookup'),
+    path('api/scans/', views.scan_batch, name='api-scans'),
+    path('api/restock/', views.restock_recommendations, name='api-restock'),
+    path('api/audit/', views.stock_audit, name='api-stock-audit'),
+    path('api/jobs/<int:pk>/', views.job_status, name='api-job-status'),
+    path('api/jobs/<int:pk>/download/', views.job_download, name='api-job-download'),
 ]
\ No newline at end of file
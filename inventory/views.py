@@ -1,10 +1,16 @@
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.http import HttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, get_user_model
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch, Q
 from django.utils import timezone # --- REQUIRED IMPORT ---
+from django.utils.dateparse import parse_date, parse_datetime
 
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework.authtoken.views import ObtainAuthToken
@@ -12,9 +18,21 @@ from rest_framework.authtoken.models import Token
 from rest_framework.exceptions import PermissionDenied
 from rest_framework.pagination import PageNumberPagination
 
-from .models import Category, Request as ItemRequest, RequestItem, Student
+from .archive import combined_history, history_needs_archive, load_history_page
+from .audit import audit_batch, audited, entries_between, entries_for_component, record
+from .authentication import is_token_expired
+from .coalescing import coalesce, invalidate_coalesced
+from .kits import expand_kits, kits_with_availability, parse_count, requested_kits
+from .lookups import LookupCache
+from .models import ArchivedRequest, Category, Job, Request as ItemRequest, RequestItem, RestockRecommendation, WaitlistEntry
 from .models import Component as Item 
-from .serializers import ItemRequestSerializer, ItemSerializer
+from .routers import read_replica
+from .scans import MAX_SCANS_PER_BATCH, apply_scans
+from .serializers import ItemRequestSerializer, ItemSerializer, KitSerializer
+from .stock_history import trend
+from .students import resolve_student
+from .throttling import HistoryThrottle, RequestListThrottle
+from .waitlist import allocate_waitlist, release_reservation, reserved_by_waitlist
 
 # Get the active User model
 User = get_user_model()
@@ -26,36 +44,59 @@ User = get_user_model()
 @login_required
 def dashboard(request):
     """View for students to see their own request history."""
-    my_requests = ItemRequest.objects.filter(student=request.user).order_by('-requested_at')
-    return render(request, 'inventory/dashboard.html', {'my_requests': my_requests})
+    my_requests = ItemRequest.objects.filter(student=request.user).order_by('-requested_at').prefetch_related(
+        'items', Prefetch('items__component', queryset=Item.objects.for_listing()),
+    )
+    my_waitlist = WaitlistEntry.objects.filter(student=request.user, status='waiting').select_related('component')
+    return render(request, 'inventory/dashboard.html', {'my_requests': my_requests, 'my_waitlist': my_waitlist})
 
 @login_required
 def new_request(request):
     """View for students to submit a new component request."""
     # Using 'Item' as imported above to avoid naming confusion
-    components = Item.objects.filter(available_quantity__gt=0)
+    # Out-of-stock components stay listed so students can join the waitlist
+    components = Item.objects.for_listing()
+    kits = kits_with_availability().filter(available_kits__gt=0)
     
     if request.method == 'POST':
         names = request.POST.getlist('component_name[]')
         quantities = request.POST.getlist('quantity[]')
-        
-        new_req = ItemRequest.objects.create(student=request.user)
-        
-        for name, qty in zip(names, quantities):
-            if name.strip() and int(qty) > 0:
-                try:
-                    component = Item.objects.get(name=name)
-                    RequestItem.objects.create(
-                        request=new_req,
-                        component=component,
-                        quantity=qty
-                    )
-                except Item.DoesNotExist:
-                    continue 
-                    
+        try:
+            kit_quantities = requested_kits(request.POST.getlist('kit_id[]'), request.POST.getlist('kit_quantity[]'))
+            lines = [(name.strip(), parse_count(qty, "Quantity")) for name, qty in zip(names, quantities)]
+        except ValueError as exc:
+            return render(request, 'inventory/new_request.html',
+                          {'components': components, 'kits': kits, 'error': str(exc)}, status=400)
+
+        # All or nothing: a failure mustn't leave an empty pending request behind
+        with transaction.atomic():
+            new_req = ItemRequest.objects.create(student=request.user)
+
+            # Kits are expanded server-side into their component lines
+            expand_kits(new_req, kit_quantities)
+
+            for name, qty in lines:
+                if name and qty > 0:
+                    try:
+                        component = Item.objects.get(name=name)
+                        if component.available_quantity <= 0:
+                            WaitlistEntry.objects.create(component=component, student=request.user, quantity=qty)
+                            continue
+                        RequestItem.objects.create(
+                            request=new_req,
+                            component=component,
+                            quantity=qty
+                        )
+                    except Item.DoesNotExist:
+                        continue
+
+            # Everything went to the waitlist: don't leave an empty request behind
+            if not new_req.items.exists():
+                new_req.delete()
+
         return redirect('dashboard')
 
-    return render(request, 'inventory/new_request.html', {'components': components})
+    return render(request, 'inventory/new_request.html', {'components': components, 'kits': kits})
 
 def signup(request):
     """Student registration view with Student ID support."""
@@ -65,19 +106,20 @@ def signup(request):
         full_name = request.POST.get('name')
         roll_no = request.POST.get('student_id') 
         
-        if User.objects.filter(username=email).exists():
-            return render(request, 'registration/signup.html', {'error': 'Email already registered'})
-
-        user = User.objects.create_user(
-            username=email, 
-            email=email, 
-            password=password,
-            first_name=full_name,
-            role='student'
-        )
-        
-        # Create the linked Student profile entry
-        Student.objects.create(user=user, student_id_code=roll_no)
+        # One transaction; the unique username/roll_number indexes catch duplicates
+        try:
+            with transaction.atomic():
+                user = User.objects.create_user(
+                    username=email, 
+                    email=email, 
+                    password=password,
+                    first_name=full_name,
+                    role='student',
+                    roll_number=roll_no,
+                )
+        except IntegrityError:
+            taken = 'Email' if User.objects.filter(username=email).exists() else 'Roll number'
+            return render(request, 'registration/signup.html', {'error': f'{taken} already registered'})
 
         login(request, user)
         return redirect('dashboard')
@@ -89,6 +131,29 @@ def signup(request):
 # 📱 API VIEWS (Flutter Incharge App)
 # ==========================================
 
+def list_queryset():
+    """Requests with everything ItemRequestSerializer touches loaded up front."""
+    return ItemRequest.objects.for_listing().prefetch_related('items')
+
+LIST_ORDERINGS = {'requested_at', '-requested_at', 'outstanding', '-outstanding'}
+
+def list_ordering(params):
+    """The requested ?ordering if it's one of LIST_ORDERINGS, else None."""
+    ordering = params.get('ordering')
+    return ordering if ordering in LIST_ORDERINGS else None
+
+def filter_outstanding(queryset, params):
+    """?outstanding=true|false and ?ordering=[-]outstanding, served from Request's totals (no joins)."""
+    outstanding = params.get('outstanding')
+    if outstanding == 'true':
+        queryset = queryset.filter(outstanding__gt=0)
+    elif outstanding == 'false':
+        queryset = queryset.filter(outstanding=0)
+    ordering = list_ordering(params)
+    if ordering:
+        queryset = queryset.order_by(ordering, '-requested_at')
+    return queryset
+
 class CustomAuthToken(ObtainAuthToken):
     """Login endpoint for Incharges (is_staff) only."""
     def post(self, request, *args, **kwargs):
@@ -101,58 +166,91 @@ class CustomAuthToken(ObtainAuthToken):
             raise PermissionDenied("Access denied. Only IdeaLab Incharges can log in.")
 
         token, created = Token.objects.get_or_create(user=user)
+        if not created and is_token_expired(token.created):
+            # Rotate: deleting the old token also evicts it from the auth cache
+            token.delete()
+            token = Token.objects.create(user=user)
         return Response({
             'token': token.key,
             'user_id': user.pk,
             'is_staff': user.is_staff
         })
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def logout_token(request):
+    """Deletes the caller's token (and its cache entry) so the app can log out."""
+    Token.objects.filter(user=request.user).delete()
+    return Response({"message": "Logged out"}, status=200)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@throttle_classes([RequestListThrottle])
+@coalesce
+@read_replica()
 def request_list(request):
     """Fetch all requests for the Incharge app's pending list."""
-    requests = ItemRequest.objects.all().order_by('-requested_at')
-    serializer = ItemRequestSerializer(requests, many=True)
+    requests = list(filter_outstanding(list_queryset().order_by('-requested_at'), request.query_params))
+    serializer = ItemRequestSerializer(requests, many=True, context={'lookups': LookupCache.for_requests(requests)})
     return Response(serializer.data)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@throttle_classes([HistoryThrottle])
+@coalesce
+@read_replica()
 def request_history(request):
     """
     PAGINATED History view with filtering.
     This is the final version that handles Search (ID/Name) and Date Range.
+    Archived (cold) requests are only queried when the date range reaches them.
     """
-    queryset = ItemRequest.objects.all().order_by('-requested_at')
-    
     # 1. Get Params from Flutter
     search_query = request.query_params.get('student_id')
     start_date = request.query_params.get('start_date')
     end_date = request.query_params.get('end_date')
+    if not (start_date and end_date):
+        start_date = end_date = None
+
+    # 2. Same filters for the live and the archive tables
+    def apply_filters(queryset):
+        # Search by Roll No, Name, or Username
+        if search_query:
+            queryset = queryset.filter(
+                Q(student__roll_number__icontains=search_query) |
+                Q(student__first_name__icontains=search_query) |
+                Q(student__last_name__icontains=search_query) |
+                Q(student__username__icontains=search_query)
+            )
+        # Date Filtering
+        if start_date:
+            queryset = queryset.filter(requested_at__date__range=[start_date, end_date])
+        return queryset
+
+    queryset = filter_outstanding(apply_filters(list_queryset()).order_by('-requested_at'), request.query_params)
+
+    # 3. Pagination (Limit to 15 per page)
+    paginator = PageNumberPagination()
+    paginator.page_size = 15
 
-    # 2. Apply Dynamic Filters (Search by Roll No, Name, or Username)
-    if search_query:
-        queryset = queryset.filter(
-            Q(student__student_profile__student_id_code__icontains=search_query) |
-            Q(student__first_name__icontains=search_query) |
-            Q(student__last_name__icontains=search_query) |
-            Q(student__username__icontains=search_query)
+    if history_needs_archive(start_date):
+        archived = filter_outstanding(
+            apply_filters(ArchivedRequest.objects.for_listing().prefetch_related('items')), request.query_params,
         )
+        rows = paginator.paginate_queryset(
+            combined_history(queryset, archived, list_ordering(request.query_params)), request,
+        )
+        result_page = load_history_page(rows, queryset, archived)
+    else:
+        result_page = paginator.paginate_queryset(queryset, request)
 
-    # 3. Apply Date Filtering
-    if start_date and end_date:
-        queryset = queryset.filter(requested_at__date__range=[start_date, end_date])
-
-    # 4. Pagination (Limit to 15 per page)
-    paginator = PageNumberPagination()
-    paginator.page_size = 15
-    
-    result_page = paginator.paginate_queryset(queryset, request)
     if result_page is not None:
-        serializer = ItemRequestSerializer(result_page, many=True)
+        serializer = ItemRequestSerializer(result_page, many=True, context={'lookups': LookupCache.for_requests(result_page)})
         return paginator.get_paginated_response(serializer.data)
 
     # Fallback
-    serializer = ItemRequestSerializer(queryset, many=True)
+    requests = list(queryset)
+    serializer = ItemRequestSerializer(requests, many=True, context={'lookups': LookupCache.for_requests(requests)})
     return Response(serializer.data)
 
 
@@ -160,6 +258,8 @@ def request_history(request):
 
 @api_view(['PATCH'])
 @permission_classes([IsAuthenticated])
+@transaction.atomic
+@audited
 def update_request_status(request, pk):
     """Handles Issuing and Returning logic with Stock Management & Timestamps."""
     item_request = get_object_or_404(ItemRequest, pk=pk)
@@ -172,6 +272,8 @@ def update_request_status(request, pk):
     # --- 1. ISSUING FLOW ---
     if new_status == 'collected' and item_request.status != 'collected':
         item_request.collected_at = timezone.now()
+        # Waitlist requests already took their units out of stock when allocated
+        reserved = reserved_by_waitlist(item_request)
         
         items = RequestItem.objects.filter(request=item_request).order_by('id')
         for index, item in enumerate(items):
@@ -183,8 +285,10 @@ def update_request_status(request, pk):
             item.save()
 
             component = item.component
-            component.available_quantity -= final_qty
+            delta = -(final_qty - (item.quantity if reserved else 0))
+            component.available_quantity += delta
             component.save()
+            record(component.pk, delta, 'issue', item_request.pk)
 
         item_request.status = 'collected'
         item_request.save()
@@ -192,6 +296,7 @@ def update_request_status(request, pk):
     # --- 2. RETURNING FLOW ---
     elif new_status == 'processing_return' and data_map:
         items = RequestItem.objects.filter(request=item_request).order_by('id')
+        freed_components = []
         
         for index, item in enumerate(items):
             qty_returned_now = int(data_map.get(str(index), 0))
@@ -201,21 +306,24 @@ def update_request_status(request, pk):
                 if current_total_returned <= item.issued_quantity:
                     comp = item.component
                     # Use min to ensure available never exceeds total_quantity
+                    before = comp.available_quantity
                     comp.available_quantity = min(comp.available_quantity + qty_returned_now, comp.total_quantity)
                     comp.save()
+                    record(comp.pk, comp.available_quantity - before, 'return', item_request.pk)
+                    freed_components.append(comp.pk)
 
                     item.returned_quantity = current_total_returned
                     item.save()
 
+        # Returned units go to students waiting for them first
+        if freed_components:
+            allocate_waitlist(freed_components)
+
         # --- NEW LOGIC: Check if everything is back ---
-        updated_items = RequestItem.objects.filter(request=item_request)
-        # Check if all items that were issued are now fully returned
-        all_returned = all(
-            (i.returned_quantity or 0) >= (i.issued_quantity or 0) 
-            for i in updated_items if (i.issued_quantity or 0) > 0
-        )
+        # The item saves above kept the request's totals current
+        item_request.refresh_from_db(fields=ItemRequest.TOTAL_FIELDS)
 
-        if all_returned:
+        if item_request.all_returned:
             item_request.status = 'returned'
             item_request.return_date = timezone.now()
         else:
@@ -226,9 +334,14 @@ def update_request_status(request, pk):
 
     # --- 3. OTHER STATUS UPDATES (Rejected, etc.) ---
     else:
+        if new_status == 'rejected' and item_request.status == 'approved' and reserved_by_waitlist(item_request):
+            release_reservation(item_request)
         item_request.status = new_status
         item_request.save()
 
+    # After commit: a poll racing the bump must not cache pre-commit rows under the new generation
+    transaction.on_commit(invalidate_coalesced)
+
     return Response({
         "message": "Update successful", 
         "current_status": item_request.status,
@@ -238,17 +351,29 @@ def update_request_status(request, pk):
 def item_list_create(request):
     """Inventory Management: View stock or add new items."""
     if request.method == 'GET':
-        items = Item.objects.all()
+        items = Item.objects.for_serialization()
         serializer = ItemSerializer(items, many=True)
         return Response(serializer.data)
 
     elif request.method == 'POST':
         serializer = ItemSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save(available_quantity=request.data.get('total_quantity'))
+            with transaction.atomic(), audit_batch(request.user):
+                component = serializer.save(available_quantity=request.data.get('total_quantity'))
+                record(component.pk, component.available_quantity, 'stock_added')
+            transaction.on_commit(invalidate_coalesced)
             return Response(serializer.data, status=201)
         return Response(serializer.errors, status=400)
 
+@api_view(['GET'])
+def kit_list(request):
+    """Kits with their lines and how many full kits can be issued right now."""
+    kits = kits_with_availability().prefetch_related(
+        'lines', Prefetch('lines__component', queryset=Item.objects.for_listing()),
+    ).order_by('name')
+    serializer = KitSerializer(kits, many=True)
+    return Response(serializer.data)
+
 @api_view(['GET'])
 def get_categories(request):
     """Returns list of categories for dropdowns."""
@@ -265,4 +390,166 @@ def add_category(request):
         if created:
             return Response({"id": category.id, "name": category.name}, status=201)
         return Response({"error": "Already exists"}, status=400)
-    return Response({"error": "Name required"}, status=400)
\ No newline at end of file
+    return Response({"error": "Name required"}, status=400)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def waitlist(request):
+    """Waiting demand for out-of-stock components, in service order."""
+    entries = (
+        WaitlistEntry.objects.filter(status='waiting')
+        .order_by('component', 'priority', 'requested_at', 'id')
+        .values('id', 'component_id', 'component__name', 'student__first_name', 'quantity', 'priority', 'requested_at')
+    )
+    return Response([
+        {**row, 'component_name': row.pop('component__name'), 'student_name': row.pop('student__first_name')}
+        for row in entries
+    ])
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@audited
+def scan_batch(request):
+    """
+    Counter scanner micro-batch: {"action": "issue"|"return", "scans": [{"code", "component", "qty"}, ...]}.
+    Applies every scan in one transaction and returns per-scan results plus the touched requests.
+    """
+    scans = request.data.get('scans')
+    if not isinstance(scans, list) or not scans:
+        return Response({"error": "No scans provided"}, status=400)
+    if len(scans) > MAX_SCANS_PER_BATCH:
+        return Response({"error": f"At most {MAX_SCANS_PER_BATCH} scans per batch"}, status=400)
+
+    results, touched = apply_scans(scans, action=request.data.get('action'))
+    if touched:
+        transaction.on_commit(invalidate_coalesced)
+    requests = list(list_queryset().filter(pk__in=touched).order_by('id'))
+    serializer = ItemRequestSerializer(requests, many=True, context={'lookups': LookupCache.for_requests(requests)})
+    return Response({'results': results, 'requests': serializer.data})
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def student_lookup(request):
+    """Counter scan: ?code=<roll number or ID-card QR payload> -> the student and their open requests."""
+    student = resolve_student(request.query_params.get('code'))
+    if student is None:
+        return Response({"error": "No student with that roll number"}, status=404)
+    return Response(student)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@read_replica()
+def restock_recommendations(request):
+    """Nightly restock suggestions (see refresh_forecasts), most urgent first."""
+    rows = RestockRecommendation.objects.all()
+    if request.query_params.get('all') != 'true':
+        rows = rows.filter(suggested_order__gt=0)
+    data = rows.order_by('-suggested_order').values(
+        'component_id', 'component__name', 'avg_daily_7', 'avg_daily_28', 'semester_peak',
+        'outstanding', 'reorder_point', 'suggested_order', 'computed_at',
+    )
+    return Response([
+        {**row, 'component_name': row.pop('component__name')} for row in data
+    ])
+
+def visible_jobs(user):
+    """Jobs a user may poll/download: their own, or any for staff."""
+    return Job.objects.all() if user.is_staff else Job.objects.filter(created_by=user)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def job_status(request, pk):
+    """Polled by clients after enqueuing long-running work."""
+    job = get_object_or_404(visible_jobs(request.user), pk=pk)
+    return Response({
+        'id': job.pk,
+        'name': job.name,
+        'status': job.status,
+        'attempts': job.attempts,
+        'result': job.result,
+        'error': job.error if job.status == 'failed' else '',
+        'has_output': bool(job.output_name),
+        'created_at': job.created_at,
+        'finished_at': job.finished_at,
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def job_download(request, pk):
+    """Serves a finished job's file output (e.g. the admin CSV export)."""
+    job = get_object_or_404(visible_jobs(request.user), pk=pk)
+    if job.status != 'succeeded' or not job.output_name:
+        return Response({"error": "Not ready", "status": job.status}, status=409)
+    response = HttpResponse(job.output, content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{job.output_name}"'
+    return response
+
+def _parse_moment(value, end_of_day=False):
+    """
+    ISO date or datetime from a query param; None if missing, ValueError if invalid.
+    Offsets are converted so the result compares with the DB values (naive local time
+    unless USE_TZ).
+    """
+    if not value:
+        return None
+    # Dates first: parse_datetime also accepts a bare date (as midnight)
+    try:
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is not None:
+        moment = datetime.combine(day, time.max if end_of_day else time.min)
+    else:
+        moment = parse_datetime(value)
+        if moment is None:
+            raise ValueError(f"Not an ISO date/datetime: {value!r}")
+    if settings.USE_TZ and timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    elif not settings.USE_TZ and timezone.is_aware(moment):
+        moment = timezone.make_naive(moment)
+    return moment
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@read_replica()
+def stock_audit(request):
+    """Stock audit trail, newest first. Filter with ?component=<id>&start=<date>&end=<date> (both inclusive)."""
+    params = request.query_params
+    try:
+        component_id = int(params['component']) if params.get('component') else None
+        start = _parse_moment(params.get('start'))
+        end = _parse_moment(params.get('end'), end_of_day=True)
+    except ValueError:
+        return Response({"error": "component must be an id, start/end ISO dates or datetimes"}, status=400)
+    if component_id:
+        entries = entries_for_component(component_id, start, end)
+    else:
+        entries = entries_between(start, end)
+    entries = entries.values(
+        'id', 'component_id', 'component__name', 'delta', 'reason', 'request_ref', 'user__username', 'created_at',
+    )
+
+    paginator = PageNumberPagination()
+    paginator.page_size = 50
+    page = paginator.paginate_queryset(entries, request)
+    return paginator.get_paginated_response([
+        {**row, 'component_name': row.pop('component__name'), 'user': row.pop('user__username')}
+        for row in page
+    ])
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@read_replica()
+def stock_trend(request, pk):
+    """Stock level of a component over ?start=&end= (default: last 30 days), at the coarsest resolution needed."""
+    get_object_or_404(Item.objects.only('id'), pk=pk)
+    try:
+        end = _parse_moment(request.query_params.get('end'), end_of_day=True) or timezone.now()
+        start = _parse_moment(request.query_params.get('start')) or end - timedelta(days=30)
+    except ValueError:
+        return Response({"error": "Invalid range or resolution"}, status=400)
+    resolution = request.query_params.get('resolution')
+    if start > end or resolution not in (None, 'raw', 'hour', 'day'):
+        return Response({"error": "Invalid range or resolution"}, status=400)
+    return Response({'component': pk, 'start': start, 'end': end, **trend(pk, start, end, resolution)})
+
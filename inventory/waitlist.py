@@ -0,0 +1,75 @@
+from django.db import transaction
+from django.utils import timezone
+
+from .audit import audit_batch, record
+from .models import Component, Request, RequestItem, WaitlistEntry
+
+
+@transaction.atomic
+def allocate_waitlist(component_ids):
+    """
+    Hands freed stock of ``component_ids`` to waiting students.
+
+    Each component's queue is read in (priority, requested_at) order through the partial
+    waitlist_queue_idx and only until its stock runs out, so the cost is proportional to the
+    entries served, not the queue length. Strict FIFO: an entry that doesn't fit stops that
+    component's queue so large early requests aren't starved by later small ones.
+    Every served entry becomes an 'approved' Request reserving the units; all rows are
+    written with bulk queries. Returns the allocated WaitlistEntry objects.
+    """
+    components = Component.objects.select_for_update().filter(pk__in=set(component_ids)).order_by('pk')
+    now = timezone.now()
+    served = []
+    touched = []
+
+    for component in components:
+        queue = WaitlistEntry.objects.filter(component=component, status='waiting').order_by('priority', 'requested_at', 'id')
+        allocated_any = False
+        for entry in queue.iterator(chunk_size=100):
+            if entry.quantity > component.available_quantity:
+                break
+            component.available_quantity -= entry.quantity
+            entry.status = 'allocated'
+            entry.allocated_at = now
+            served.append(entry)
+            allocated_any = True
+        if allocated_any:
+            touched.append(component)
+
+    if not served:
+        return []
+
+    requests = Request.objects.bulk_create([
+        Request(student_id=entry.student_id, status='approved') for entry in served
+    ])
+    RequestItem.objects.bulk_create([
+        RequestItem(request=req, component_id=entry.component_id, quantity=entry.quantity)
+        for req, entry in zip(requests, served)
+    ])
+    Request.refresh_totals(Request.objects.filter(pk__in=[req.pk for req in requests]))
+    with audit_batch():
+        for req, entry in zip(requests, served):
+            entry.request = req
+            record(entry.component_id, -entry.quantity, 'waitlist_reserve', req.pk)
+    WaitlistEntry.objects.bulk_update(served, ['status', 'allocated_at', 'request'])
+    Component.objects.bulk_update(touched, ['available_quantity'])
+    return served
+
+
+def reserved_by_waitlist(item_request):
+    """True if the request was created by the allocator, i.e. its item quantities are already deducted from stock."""
+    return item_request.waitlist_entries.exists()
+
+
+def release_reservation(item_request):
+    """Puts the units reserved for a waitlist request back into stock and re-runs allocation."""
+    items = list(RequestItem.objects.filter(request=item_request).select_related('component'))
+    with audit_batch():
+        for item in items:
+            before = item.component.available_quantity
+            item.component.available_quantity = min(
+                item.component.available_quantity + item.quantity, item.component.total_quantity
+            )
+            record(item.component_id, item.component.available_quantity - before, 'waitlist_release', item_request.pk)
+        Component.objects.bulk_update([item.component for item in items], ['available_quantity'])
+        allocate_waitlist([item.component_id for item in items])
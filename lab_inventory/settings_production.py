@@ -0,0 +1,45 @@
+"""
+Production settings for lab_inventory.
+
+Everything is inherited from settings.py; this module only switches off the
+development defaults and turns on the deployment tuning. Select it with
+DJANGO_SETTINGS_MODULE=lab_inventory.settings_production (the Procfile does this).
+"""
+
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES
+
+DEBUG = os.environ.get('DJANGO_DEBUG', 'false').lower() == 'true'
+
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', SECRET_KEY)  # noqa: F405
+
+ALLOWED_HOSTS = os.environ.get(
+    'ALLOWED_HOSTS', 'ilabmec.engineer,www.ilabmec.engineer'
+).split(',')
+
+# --- DATABASE CONNECTIONS ---
+# Sync (gthread) workers reuse one connection per thread for CONN_MAX_AGE seconds.
+# Under the ASGI/uvicorn worker every request runs in a fresh thread, so persistent
+# connections would pile up; close them per request instead.
+if os.environ.get('GUNICORN_WORKER_CLASS', 'gthread') == 'uvicorn':
+    for _db in DATABASES.values():
+        _db['CONN_MAX_AGE'] = 0
+
+# --- STATIC FILES (WhiteNoise) ---
+# Hashed filenames + pre-compressed .gz/.br copies, served with far-future cache headers.
+# Run `python manage.py collectstatic --noinput` at build time.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
+# --- SECURITY ---
+SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
+SESSION_COOKIE_SECURE = True
+CSRF_COOKIE_SECURE = True
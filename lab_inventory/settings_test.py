@@ -0,0 +1,36 @@
+"""
+Test settings for lab_inventory.
+
+In-memory SQLite and a fast password hasher, so the suite runs anywhere without
+Postgres. `python manage.py test` picks this module automatically.
+"""
+
+from .settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    },
+    # Stand-in replica: a second alias over the same test database. Routing tests
+    # enable it with override_settings(DATABASE_REPLICAS=['replica']).
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+DATABASE_REPLICAS = []
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# No collectstatic in tests: let WhiteNoise look files up lazily
+WHITENOISE_AUTOREFRESH = True
+
+DEBUG = False
@@ -6,6 +6,9 @@ import sys
 
 def main():
     """Run administrative tasks."""
+    # Tests run on in-memory SQLite (lab_inventory/settings_test.py), no Postgres needed
+    if len(sys.argv) > 1 and sys.argv[1] == 'test':
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lab_inventory.settings_test')
     os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lab_inventory.settings')
     try:
         from django.core.management import execute_from_command_line
@@ -1,14 +1,28 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
 from django.contrib.auth.admin import UserAdmin
 from .models import User
 
+
+class UserChangeList(ChangeList):
+    # The list only shows a few columns; the change form still loads whole users
+    def get_queryset(self, request, exclude_parameters=None):
+        return super().get_queryset(request, exclude_parameters).for_serialization()
+
+
 class CustomUserAdmin(UserAdmin):
     fieldsets = UserAdmin.fieldsets + (
-        ("Role Information", {"fields": ("role",)}),
+        ("Role Information", {"fields": ("role", "roll_number")}),
     )
 
     add_fieldsets = UserAdmin.add_fieldsets + (
-        ("Role Information", {"fields": ("role",)}),
+        ("Role Information", {"fields": ("role", "roll_number")}),
     )
 
-admin.site.register(User, CustomUserAdmin)
\ No newline at end of file
+    list_display = UserAdmin.list_display + ('roll_number',)
+    search_fields = UserAdmin.search_fields + ('roll_number',)
+
+    def get_changelist(self, request, **kwargs):
+        return UserChangeList
+
+admin.site.register(User, CustomUserAdmin)
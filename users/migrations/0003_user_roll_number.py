@@ -0,0 +1,18 @@
+# Generated by Django 5.2.11 on 2026-10-19 06:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_alter_user_managers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='roll_number',
+            field=models.CharField(blank=True, max_length=20, null=True, unique=True),
+        ),
+    ]
@@ -1,6 +1,45 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager as DjangoUserManager
 from django.db import models
 
+
+class UserQuerySet(models.QuerySet):
+    # Enough to show a user in a list; skips the password hash, permission flags and timestamps
+    LISTING_FIELDS = ('id', 'username', 'first_name', 'last_name', 'role', 'roll_number')
+    SERIALIZATION_FIELDS = LISTING_FIELDS + ('email', 'is_staff', 'is_active', 'date_joined')
+
+    def for_listing(self):
+        return self.only(*self.LISTING_FIELDS)
+
+    def for_serialization(self):
+        return self.only(*self.SERIALIZATION_FIELDS)
+
+    def by_roll_number(self, code):
+        """Students matching a typed roll number (one unique-index lookup)."""
+        return self.filter(roll_number=normalize_roll_number(code))
+
+
+class UserManager(DjangoUserManager.from_queryset(UserQuerySet)):
+    pass
+
+
+def normalize_roll_number(code):
+    """
+    Canonical form of a roll number, as stored in User.roll_number. Roll numbers may
+    contain '/' or ':' (``MEC/21/CS/001``), so ID-card QR payloads are only unpacked
+    by the counter lookups (inventory.students.scanned_roll_numbers).
+    """
+    return (code or '').strip().upper() or None
+
+
+def deferred_user_fields(relation):
+    """
+    Heavy user columns to ``defer()`` when users are joined in through ``relation``:
+    ``Request.objects.select_related('student').defer(*deferred_user_fields('student'))``.
+    """
+    listed = set(UserQuerySet.LISTING_FIELDS)
+    return [f'{relation}__{f.name}' for f in User._meta.concrete_fields if f.name not in listed]
+
+
 class User(AbstractUser):
     ROLE_CHOICES = (
         ('student', 'Student'),
@@ -8,6 +47,14 @@ class User(AbstractUser):
     )
 
     role = models.CharField(max_length=20, choices=ROLE_CHOICES)
+    # College roll number (students only); unique, so it's also the lookup index
+    roll_number = models.CharField(max_length=20, unique=True, null=True, blank=True)
+
+    objects = UserManager()
+
+    def save(self, *args, **kwargs):
+        self.roll_number = normalize_roll_number(self.roll_number)
+        super().save(*args, **kwargs)
 
     def __str__(self):
-        return self.username
\ No newline at end of file
+        return self.username